@@ -0,0 +1,358 @@
+'''
+Created on Oct 18, 2026
+
+Bounded cache for data loaded from files, such as the property and text
+files used by i18n. Entries are evicted least recently used first once
+either the entry count or the byte budget is exceeded and are revalidated
+against the file's modification time and size so that a changed file is
+reloaded rather than served stale.
+
+@license: GNU LGPL v3
+'''
+
+import itertools
+import os
+import threading
+import time
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+# minimum number of seconds between two stat() calls for the same entry
+DEFAULT_CHECK_INTERVAL = 2.0
+
+
+class _CacheEntry(object):
+    __slots__ = ('value', 'path', 'mtime', 'size', 'cost', 'checked', 'used')
+
+    def __init__(self, value, path, mtime, size, cost, checked, used):
+        self.value = value
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+        self.cost = cost
+        self.checked = checked
+        self.used = used
+
+
+class _Loading(object):
+    '''
+    A load in progress which other threads can wait for
+    '''
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class CacheStats(object):
+    '''
+    Counts of cache activity. Counters are updated without taking a lock
+    so may undercount slightly when the cache is used by many threads.
+    '''
+    __slots__ = ('hits', 'misses', 'loads', 'load_seconds')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_seconds = 0.0
+
+    def as_dict(self):
+        return { 'hits' : self.hits,
+                 'misses' : self.misses,
+                 'loads' : self.loads,
+                 'load_seconds' : self.load_seconds }
+
+
+class FileCache(object):
+    '''
+    Cache of values derived from files. Entries are usually keyed by the
+    path of the file, but several values can be derived from the same file
+    using different keys, in which case they are invalidated together.
+    max_entries limits the number of entries keyed by path, derived values
+    such as the options split from a property only count towards max_bytes
+    so that using many of them doesn't evict whole files.
+
+    Lookups only stamp the entry with a use counter, the least recently used
+    entry is found when something needs to be evicted. An entry is checked
+    against the file on disk at most once every check_interval seconds. If
+    the file has been modified the entry is dropped, if the file can no
+    longer be found the cached value continues to be served.
+
+    Entries for files in a directory passed to watch_dir() are never
+    revalidated by lookups, whoever watches the directory replaces them
+    with replace() once a changed file has been loaded successfully.
+
+    The cache can be shared between threads. Lookups don't take a lock,
+    changes to the cache do. Use get_or_load() so that only one thread loads
+    a given entry while any others wait for the result.
+    '''
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 check_interval=DEFAULT_CHECK_INTERVAL):
+        super(FileCache, self).__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self.entries = { }
+        self.total_bytes = 0
+        self._ticks = itertools.count()
+        self._lock = threading.RLock()
+        self._loading = { }
+        # directory prefix -> number of watchers
+        self._watched_dirs = { }
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def configure(self, max_entries=None, max_bytes=None, check_interval=None):
+        if not max_entries is None:
+            self.max_entries = max_entries
+        if not max_bytes is None:
+            self.max_bytes = max_bytes
+        if not check_interval is None:
+            self.check_interval = check_interval
+        with self._lock:
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self.entries = { }
+            self.total_bytes = 0
+
+    def watch_dir(self, dir_name):
+        '''
+        Stop lookups revalidating the files in dir_name, changes to them are
+        picked up by the caller instead. Calls should be matched by calls
+        to unwatch_dir().
+        '''
+        prefix = os.path.join(dir_name, '')
+        with self._lock:
+            self._watched_dirs[prefix] = self._watched_dirs.get(prefix, 0) + 1
+
+    def unwatch_dir(self, dir_name):
+        prefix = os.path.join(dir_name, '')
+        with self._lock:
+            count = self._watched_dirs.get(prefix, 0) - 1
+            if count > 0:
+                self._watched_dirs[prefix] = count
+            else:
+                self._watched_dirs.pop(prefix, None)
+
+    def is_watched(self, path):
+        if not isinstance(path, basestring):
+            return False
+        for prefix in self._watched_dirs.keys():
+            if path.startswith(prefix):
+                return True
+        return False
+
+    def reset_stats(self):
+        self.totals = CacheStats()
+        self.path_stats = { }
+
+    def _stats_for(self, path):
+        stats = self.path_stats.get(path)
+        if stats is None:
+            stats = self.path_stats.setdefault(path, CacheStats())
+        return stats
+
+    def stats(self):
+        '''
+        Return a dict of the cache activity since the stats were last reset,
+        in total and broken down by file
+        '''
+        result = self.totals.as_dict()
+        result['entries'] = len(self.entries)
+        result['bytes'] = self.total_bytes
+        paths = { }
+        for path, stats in self.path_stats.items():
+            paths[path] = stats.as_dict()
+            paths[path]['bytes'] = 0
+        for entry in self.entries.values():
+            if not entry.path in paths:
+                paths[entry.path] = CacheStats().as_dict()
+                paths[entry.path]['bytes'] = 0
+            paths[entry.path]['bytes'] += entry.cost
+        result['paths'] = paths
+        return result
+
+    def get(self, key):
+        '''
+        Return the cached value or None if there is no valid entry for key
+        '''
+        value = self._lookup(key)
+        if value is None:
+            self.totals.misses += 1
+            self._stats_for(key).misses += 1
+        return value
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        now = time.time()
+        if now - entry.checked >= self.check_interval:
+            entry.checked = now
+            if not self.is_watched(entry.path) and not self._is_current(entry):
+                self.invalidate_file(entry.path)
+                return None
+        entry.used = next(self._ticks)
+        self.totals.hits += 1
+        self._stats_for(entry.path).hits += 1
+        return entry.value
+
+    def get_or_load(self, key, loader, path=None, cost=None):
+        '''
+        Return the cached value for key, calling loader() to create it if
+        needed. If another thread is already loading key, wait for it to
+        finish rather than loading it again. A value of None is not cached.
+        cost, if given, is a function which returns the size of the value.
+        '''
+        value = self._lookup(key)
+        if not value is None:
+            return value
+        if path is None:
+            path = key
+        self.totals.misses += 1
+        self._stats_for(path).misses += 1
+        with self._lock:
+            entry = self.entries.get(key)
+            if not entry is None:
+                return entry.value
+            loading = self._loading.get(key)
+            leader = loading is None
+            if leader:
+                loading = _Loading()
+                self._loading[key] = loading
+        if not leader:
+            loading.done.wait()
+            if not loading.error is None:
+                raise loading.error
+            return loading.value
+        try:
+            # taken before loading so that if the file changes while it is
+            # being read the entry is seen to be out of date
+            signature = file_signature(path)
+            start = time.time()
+            value = loader()
+            elapsed = time.time() - start
+            stats = self._stats_for(path)
+            stats.loads += 1
+            stats.load_seconds += elapsed
+            self.totals.loads += 1
+            self.totals.load_seconds += elapsed
+            if not value is None:
+                self._store(key, value, path, None if cost is None else cost(value), signature)
+            loading.value = value
+            return value
+        except Exception as e:
+            loading.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.done.set()
+
+    def put(self, key, value, path=None, cost=None):
+        '''
+        Store value under key. The value is validated against path, which
+        defaults to the key. If cost (in bytes) is not given the size of the
+        file is used.
+        '''
+        if path is None:
+            path = key
+        self._store(key, value, path, cost, file_signature(path))
+
+    def replace(self, path, value, signature):
+        '''
+        Replace the value loaded from path in a single step, so readers see
+        either the old or the new value, and drop any values derived from
+        the old version. signature is the (mtime, size) of the file taken
+        before the new value was loaded.
+        '''
+        with self._lock:
+            self.invalidate_file(path)
+            self._store(path, value, path, None, signature)
+
+    def changed_files(self):
+        '''
+        Return the paths of the files which have been modified since any
+        of the values cached for them, including values derived from them,
+        were loaded
+        '''
+        changed = []
+        signatures = { }
+        for entry in self.entries.values():
+            if entry.path in changed:
+                continue
+            if not entry.path in signatures:
+                signatures[entry.path] = file_signature(entry.path)
+            (mtime, size) = signatures[entry.path]
+            if not mtime is None and (mtime != entry.mtime or size != entry.size):
+                changed.append(entry.path)
+        return changed
+
+    def _store(self, key, value, path, cost, signature):
+        (mtime, size) = signature
+        if cost is None:
+            cost = size if not size is None else _estimate_cost(value)
+        entry = _CacheEntry(value, path, mtime, size, cost, time.time(), next(self._ticks))
+        with self._lock:
+            self.invalidate(key)
+            self.entries[key] = entry
+            self.total_bytes += cost
+            self._evict()
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self.entries.pop(key, None)
+            if not entry is None:
+                self.total_bytes -= entry.cost
+
+    def invalidate_file(self, path):
+        '''
+        Drop all the entries which were derived from the file path
+        '''
+        with self._lock:
+            for key in [k for k, e in self.entries.items() if e.path == path]:
+                self.invalidate(key)
+
+    def _is_current(self, entry):
+        (mtime, size) = file_signature(entry.path)
+        if mtime is None:
+            # file has gone away, keep serving what we have
+            return True
+        return mtime == entry.mtime and size == entry.size
+
+    def _evict(self):
+        # always keep the most recent entry, even if it is over budget
+        while len(self.entries) > 1:
+            files = [k for k, e in self.entries.items() if k == e.path]
+            if len(files) > self.max_entries:
+                candidates = files
+            elif self.total_bytes > self.max_bytes:
+                candidates = self.entries.keys()
+            else:
+                break
+            key = min(candidates, key=lambda k: self.entries[k].used)
+            self.invalidate(key)
+
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime, st.st_size)
+    except (OSError, TypeError):
+        return (None, None)
+
+def _estimate_cost(value):
+    try:
+        return len(value)
+    except TypeError:
+        return 0
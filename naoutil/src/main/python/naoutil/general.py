@@ -42,24 +42,58 @@ def split_FQCN(s):
     else:
         return (None, s)
 
+# classes already found by find_class, keyed by FQCN
+_class_cache = {}
+
 '''
-Look up a class from a FQCN
+Look up a class from a FQCN. The class may be nested inside another class,
+for example module.Outer.Inner. Classes found are remembered, use
+invalidate_class_cache() if a module is reloaded.
 '''
 def find_class(fqcn):
-    (moduleName, className) = split_FQCN(fqcn)
-    m = None
-    if not moduleName is None:
-        try:
-            m = __import__(moduleName)
-        except ImportError:
-            print "Unable to import from {}".format(moduleName)
-    
-    #for name, obj in inspect.getmembers(m):
-    for name, obj in inspect.getmembers(sys.modules[moduleName]):
-        if inspect.isclass(obj) and className == name:
+    try:
+        return _class_cache[fqcn]
+    except KeyError:
+        pass
+
+    klass = _resolve_class(fqcn)
+    if klass is None:
+        raise TypeError("Can't find class {}".format(fqcn))
+    _class_cache[fqcn] = klass
+    return klass
+
+def _resolve_class(fqcn):
+    parts = fqcn.split('.')
+    # try the longest module name first, the remaining parts are attributes
+    for i in range(len(parts) - 1, 0, -1):
+        moduleName = '.'.join(parts[:i])
+        m = sys.modules.get(moduleName)
+        if m is None:
+            try:
+                __import__(moduleName)
+            except ImportError:
+                continue
+            m = sys.modules[moduleName]
+        obj = m
+        for name in parts[i:]:
+            obj = getattr(obj, name, None)
+            if obj is None:
+                break
+        if inspect.isclass(obj):
             return obj
-        
-    raise TypeError("Can't find class {}".format(fqcn))
+    return None
+
+'''
+Forget classes found by find_class, either all of them or just those from
+the named module (and classes nested inside them)
+'''
+def invalidate_class_cache(moduleName=None):
+    if moduleName is None:
+        _class_cache.clear()
+    else:
+        prefix = moduleName + '.'
+        for fqcn in [k for k in _class_cache if k.startswith(prefix)]:
+            del _class_cache[fqcn]
 
 def singleton(cls):
     '''
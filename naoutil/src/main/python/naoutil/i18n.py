@@ -4,12 +4,24 @@ Created on 21/4/2012
 @author: David Snowdon (c) 2012
 '''
 
-import codecs
+import argparse
+import array
+import collections
+import marshal
+import multiprocessing
 import os
+import Queue
+import random
+import re
+import sys
+import threading
+import time
 
 import jprops
 import json
 
+from filecache import FileCache, DEFAULT_CHECK_INTERVAL, file_signature
+
 # Map language names from TTS to ISO language code
 # ISO language codes from http://en.wikipedia.org/wiki/List_of_ISO_639-1_codes
 LANGUAGE_MAP = {
@@ -42,24 +54,60 @@ DEFAULT_LANGUAGE_CODE = "en"
 EXT_PROPERTIES = ".properties"
 EXT_JSON = ".json"
 EXT_TEXT = ".txt"
+EXT_CATALOG = ".catalog"
+
+# compiled catalogs are stored using marshal whose format depends on the python version
+CATALOG_HEADER = "NAOCAT2" + chr(sys.version_info[0]) + chr(sys.version_info[1])
+
+# directory modification times may only be accurate to the second, so a file
+# added this soon after a directory was scanned may not change its mtime
+MTIME_GRANULARITY = 1.0
+
+# files named basename_XX where XX is a 2 letter ISO language code
+_LANGUAGE_SUFFIX = re.compile(r'^(.+)_([a-z]{2})$')
 
 # cache property data read from file to avoid need for a file read on every property access
-property_file_cache = {}
+property_file_cache = FileCache()
+
+# index of the files in each set of resource dirs used, keyed by tuple of dir names
+resource_indexes = {}
+resource_index_lock = threading.Lock()
+
+def configure_cache(max_entries=None, max_bytes=None, check_interval=None):
+    """
+        Set the maximum number of files and bytes held in the cache and the
+        minimum number of seconds between checks that a cached file is unchanged
+    """
+    property_file_cache.configure(max_entries, max_bytes, check_interval)
 
 def clear_cache():
-    global property_file_cache
-    property_file_cache = {}
+    property_file_cache.clear()
+    clear_resource_indexes()
+
+def clear_resource_indexes():
+    resource_indexes.clear()
+
+def cache_stats():
+    """
+        Get a dict describing the use of the cache: hits, misses, loads, time
+        spent loading files, bytes held and the same broken down per file.
+        negative_hits is the number of lookups for resources which don't
+        exist that were answered without going to the filesystem.
+    """
+    stats = property_file_cache.stats()
+    stats['negative_hits'] = sum(index.negative_hits for index in resource_indexes.values())
+    return stats
+
+def reset_cache_stats():
+    property_file_cache.reset_stats()
+    for index in resource_indexes.values():
+        index.negative_hits = 0
 
 def get_from_cache(path):
-    global property_file_cache
-    try:
-        return property_file_cache[path]
-    except KeyError:
-        return None
+    return property_file_cache.get(path)
 
 def put_in_cache(filename, properties):
-    global property_file_cache
-    property_file_cache[filename] = properties
+    property_file_cache.put(filename, properties)
 
 def language_to_code(languageName):
     global LANGUAGE_MAP
@@ -82,55 +130,367 @@ def make_filename(basename, language_code, ext):
 def find_resource(dir_name, basename, language_code, exts):
     """
         First try the requested language and if that file does not exist
-        try the default language.
+        try the default language. dir_name can be a single directory or a
+        list of directories searched in priority order. If language_code is
+        None the file name is expected not to have a language suffix.
+        basename can include subdirectories, such as conf/app.
     """
-    global DEFAULT_LANGUAGE_CODE
-    # first try with requested language
-    for ext in exts:
-        filename = make_filename(basename, language_code, ext)
-        path = dir_name + '/' + filename
-        if get_from_cache(path) or os.path.exists(path):
-            return path
-
-    # now try with default language
-    for ext in exts:
-        filename = make_filename(basename, DEFAULT_LANGUAGE_CODE, ext)
-        path = dir_name + '/' + filename
-        if get_from_cache(path) or os.path.exists(path):
-            return path
-
-    return None
+    (subdir, basename) = os.path.split(basename)
+    if subdir:
+        # the files in a subdirectory are indexed separately
+        if isinstance(dir_name, basestring):
+            dir_name = [ dir_name ]
+        dir_name = [ os.path.join(d, subdir) for d in dir_name ]
+    return get_resource_index(dir_name).find(basename, language_code, exts)
+
+def get_resource_index(dir_name):
+    """
+        Get the index of the files in dir_name (a directory or a list of
+        directories), rescanning if any of the directories has changed
+    """
+    if isinstance(dir_name, basestring):
+        key = (dir_name, )
+    else:
+        key = tuple(dir_name)
+    index = resource_indexes.get(key)
+    if index is None:
+        with resource_index_lock:
+            index = resource_indexes.get(key)
+            if index is None:
+                index = ResourceIndex(key)
+                resource_indexes[key] = index
+    else:
+        index.refresh_if_changed(property_file_cache.check_interval)
+    return index
+
+class ResourceIndex(object):
+    """
+        Map of (basename, language code, extension) to the file which provides
+        that resource, built by listing each resource directory once. Where
+        more than one directory provides the same file the first directory
+        listed wins. Files without a language suffix, such as config.json,
+        are stored with a language code of None. Lookups which fail are
+        remembered so that they don't cause the directories to be rechecked.
+        A directory modified within MTIME_GRANULARITY of being scanned is
+        unsettled, as a file could be added without changing its mtime, so
+        it is scanned again on each lookup and failures aren't remembered
+        until it settles.
+    """
+    def __init__(self, dir_names):
+        super(ResourceIndex, self).__init__()
+        if isinstance(dir_names, basestring):
+            dir_names = [dir_names]
+        self.dir_names = list(dir_names)
+        self.files = {}
+        self.missing = set()
+        self.negative_hits = 0
+        self.dir_mtimes = []
+        self.checked = 0
+        self.settled = False
+        self.refresh()
+
+    def refresh(self):
+        files = {}
+        dir_mtimes = []
+        # add lower priority dirs first so that higher priority ones replace their entries
+        for dir_name in reversed(self.dir_names):
+            try:
+                dir_mtimes.append(os.stat(dir_name).st_mtime)
+                names = os.listdir(dir_name)
+            except OSError:
+                dir_mtimes.append(None)
+                names = []
+            for name in names:
+                path = os.path.join(dir_name, name)
+                for key in parse_filename(name):
+                    files[key] = path
+        dir_mtimes.reverse()
+        now = time.time()
+        self.files = files
+        self.missing = set()
+        self.dir_mtimes = dir_mtimes
+        self.checked = now
+        self.settled = all(mtime is None or abs(now - mtime) >= MTIME_GRANULARITY
+                           for mtime in dir_mtimes)
+
+    def refresh_if_changed(self, check_interval=0):
+        """
+            Rescan the directories if any of them has been modified, checking
+            at most once every check_interval seconds
+        """
+        if not self.settled:
+            self.refresh()
+            return True
+        now = time.time()
+        if now - self.checked < check_interval:
+            return False
+        self.checked = now
+        for dir_name, mtime in zip(self.dir_names, self.dir_mtimes):
+            try:
+                current = os.stat(dir_name).st_mtime
+            except OSError:
+                current = None
+            if current != mtime:
+                self.refresh()
+                return True
+        return False
+
+    def get(self, basename, language_code, ext):
+        """
+            Return the path of the file for exactly this basename, language and extension
+        """
+        key = (basename, language_code, ext)
+        path = self.files.get(key)
+        if path is None:
+            # files which have gone away since being loaded are still served from the cache
+            for dir_name in self.dir_names:
+                candidate = os.path.join(dir_name, unparse_filename(*key))
+                if candidate in property_file_cache:
+                    return candidate
+        return path
+
+    def find(self, basename, language_code, exts):
+        """
+            Find the file for basename in the requested language, falling back
+            to the default language. The first time a resource is not found the
+            directories are checked for new files, after that the failure is
+            remembered until the index is refreshed.
+        """
+        path = self._find(basename, language_code, exts)
+        if path is None:
+            key = (basename, language_code, tuple(exts))
+            if key in self.missing:
+                self.negative_hits += 1
+            else:
+                if self.refresh_if_changed():
+                    path = self._find(basename, language_code, exts)
+                if path is None and self.settled:
+                    self.missing.add(key)
+        return path
+
+    def _find(self, basename, language_code, exts):
+        global DEFAULT_LANGUAGE_CODE
+        if language_code is None:
+            language_codes = [ None ]
+        else:
+            language_codes = [ language_code, DEFAULT_LANGUAGE_CODE ]
+        for lc in language_codes:
+            for ext in exts:
+                path = self.get(basename, lc, ext)
+                if not path is None:
+                    return path
+        return None
+
+def parse_filename(filename):
+    """
+        Get the index keys under which a file can be found. A file called
+        basename_XX.ext can be found both as (basename, XX, ext) and as
+        (basename_XX, None, ext).
+    """
+    (name, ext) = os.path.splitext(filename)
+    keys = [ (name, None, ext) ]
+    m = _LANGUAGE_SUFFIX.match(name)
+    if m:
+        keys.append((m.group(1), m.group(2), ext))
+    return keys
+
+def unparse_filename(basename, language_code, ext):
+    if language_code is None:
+        return basename + ext
+    return make_filename(basename, language_code, ext)
+
+def read_file_bytes(filename):
+    with open(filename, "rb") as fp:
+        return fp.read()
 
 def read_text_file(filename, encoding="utf-8"):
-    with codecs.open(filename, encoding=encoding) as fp:
-        contents = fp.read()
-        result = contents.encode("utf-8")
-    return result
+    return read_file_bytes(filename).decode(encoding).encode("utf-8")
 
 def read_text_file_with_cache(filename, encoding="utf-8"):
-    contents = get_from_cache(filename)
-    if not contents:
-        contents = read_text_file(filename, encoding)
-        if contents:
-            put_in_cache(filename, contents)
-    return contents
-
-def read_properties_file(filename, encoding="utf-8"):
-    with codecs.open(filename, encoding=encoding) as fp:
-        if filename.endswith(EXT_PROPERTIES):
-            properties = jprops.load_properties(fp)
+    return property_file_cache.get_or_load(filename,
+                                           lambda: read_text_file(filename, encoding))
+
+class TextLines(object):
+    """
+        Random access to the lines of a text file. The file is read once and
+        the offset of each line is recorded so that a line can be returned
+        without splitting the whole file into a list. The contents are held
+        rather than memory mapped so that the file being rewritten while it
+        is cached can't affect lines already indexed. As with
+        read_text_options, whitespace at the start and end of the file is
+        ignored and lines are returned encoded as UTF-8.
+    """
+    def __init__(self, filename, encoding="utf-8"):
+        super(TextLines, self).__init__()
+        self.encoding = encoding
+        self.offsets = array.array('L')
+        self.end = 0
+        with open(filename, 'rb') as fp:
+            self.data = fp.read()
+        self._index_lines()
+
+    def _index_lines(self):
+        m = self.data
+        start = 0
+        end = len(m)
+        while start < end and m[start].isspace():
+            start += 1
+        while end > start and m[end - 1].isspace():
+            end -= 1
+        self.end = end
+        pos = start
+        while pos < end:
+            self.offsets.append(pos)
+            newline = m.find('\n', pos, end)
+            if newline < 0:
+                break
+            pos = newline + 1
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.offsets)
+        start = self.offsets[i]
+        if i == len(self.offsets) - 1:
+            end = self.end
         else:
-            properties = json.load(fp)
+            end = self.offsets[i + 1] - 1
+        line = self.data[start:end]
+        if self.encoding.lower().replace('-', '') != 'utf8':
+            line = line.decode(self.encoding).encode("utf-8")
+        return line
+
+    def size_in_bytes(self):
+        return len(self.data) + self.offsets.itemsize * len(self.offsets)
+
+    def choice(self):
+        if not self.offsets:
+            return None
+        return self[random.randrange(len(self.offsets))]
+
+def read_text_lines_with_cache(filename, encoding="utf-8"):
+    """
+        Get the line index of a text file, from the cache if possible
+    """
+    return property_file_cache.get_or_load((filename, TextLines),
+                                           lambda: TextLines(filename, encoding),
+                                           path=filename,
+                                           cost=TextLines.size_in_bytes)
+
+def choose_text_line(dir_name, basename, language_code):
+    """
+        Pick a random line from the plain text file for the appropriate
+        language without building a list of all the lines. Returns None
+        if there is no file or it is empty.
+    """
+    language_code = check_language_code(language_code)
+    path = find_resource(dir_name, basename, language_code, [ EXT_TEXT ])
+    if path is None:
+        return None
+    return read_text_lines_with_cache(path).choice()
+
+def read_properties_file(filename, encoding="utf-8", lazy=False):
+    """
+        Read a properties or JSON file. If lazy is True values from a
+        properties file are only unescaped when they are looked up, which is
+        quicker for large files when only a few properties are used.
+    """
+    data = read_file_bytes(filename)
+    if filename.endswith(EXT_PROPERTIES):
+        mapping = jprops.LazyProperties if lazy else dict
+        properties = jprops.load_properties_from_bytes(data, encoding, mapping)
+    else:
+        properties = json.loads(data.decode(encoding))
     return properties
 
-def read_properties_file_with_cache(filename, encoding="utf-8"):
-    properties = get_from_cache(filename)
-    if not properties:
-        properties = read_properties_file(filename, encoding)
-        if properties:
-            put_in_cache(filename, properties)
+def read_properties_file_with_cache(filename, encoding="utf-8", lazy=False):
+    """
+        Read properties from the cache, or if they are not there from a
+        compiled catalog if one exists and is up to date, otherwise by parsing
+        the properties or JSON file
+    """
+    return property_file_cache.get_or_load(filename,
+                                           lambda: load_properties_file(filename, encoding, lazy))
+
+def load_properties_file(filename, encoding="utf-8", lazy=False):
+    properties = read_compiled_catalog(filename)
+    if properties is None:
+        properties = read_properties_file(filename, encoding, lazy)
     return properties
 
+def catalog_filename(filename):
+    return filename + EXT_CATALOG
+
+def compile_properties_file(filename, encoding="utf-8"):
+    """
+        Parse a properties or JSON file and write the result as a compiled
+        catalog alongside it. Returns the name of the catalog file.
+    """
+    signature = file_signature(filename)
+    properties = read_properties_file(filename, encoding)
+    catalog = catalog_filename(filename)
+    write_catalog(catalog, properties, signature)
+    return catalog
+
+def compile_resources(dir_name, encoding="utf-8"):
+    """
+        Compile all the properties and JSON files in dir_name. Returns the
+        names of the catalog files written.
+    """
+    catalogs = []
+    for name in sorted(os.listdir(dir_name)):
+        if name.endswith(EXT_PROPERTIES) or name.endswith(EXT_JSON):
+            catalogs.append(compile_properties_file(os.path.join(dir_name, name), encoding))
+    return catalogs
+
+def write_catalog(filename, properties, signature):
+    """
+        Write a compiled catalog. signature is the (mtime, size) of the
+        source file, taken before it was parsed.
+    """
+    # write to a temporary file and rename so that readers never see a partial catalog
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as fp:
+        fp.write(CATALOG_HEADER)
+        marshal.dump((tuple(signature), dict(properties)), fp)
+    os.rename(tmp_filename, filename)
+
+def read_catalog(filename, signature=None):
+    """
+        Read a compiled catalog, returns None if the file was not written
+        by this version of python or, if signature is given, was not compiled
+        from the version of the source file with that signature
+    """
+    with open(filename, "rb") as fp:
+        data = fp.read()
+    if not data.startswith(CATALOG_HEADER):
+        return None
+    try:
+        (compiled_from, properties) = marshal.loads(data[len(CATALOG_HEADER):])
+    except (EOFError, ValueError, TypeError):
+        return None
+    if not signature is None and tuple(signature) != compiled_from:
+        return None
+    return properties
+
+def read_compiled_catalog(filename):
+    """
+        Read the compiled catalog for a properties or JSON file if it exists
+        and was compiled from the current version of the file, otherwise
+        return None. The file's modification time and size are compared with
+        those recorded in the catalog rather than comparing modification
+        times, which may be too coarse to tell that the file has changed.
+    """
+    signature = file_signature(filename)
+    if signature[0] is None:
+        return None
+    try:
+        return read_catalog(catalog_filename(filename), signature)
+    except IOError:
+        return None
+
 def read_text_options(dir_name, basename, language_code, property_name=None, separator='/'):
     """
         Gets a list of text options to choose from for the appropriate language
@@ -151,21 +511,239 @@ def read_text_options(dir_name, basename, language_code, property_name=None, sep
         # should be a properties or JSONfile
         path = find_resource(dir_name, basename, language_code, [EXT_PROPERTIES, EXT_JSON ])
         if not path is None:
-            props = read_properties_file_with_cache(path)
-            value = props[property_name]
-            # if we loaded from JSON this will already be a list
-            if isinstance(value, basestring):
-                contents = value.strip()
-                contents = contents.encode("utf-8")
-                return contents.split(separator)
-            else:
-                contents = []
-                for x in value:
-                    contents.append(x.strip().encode("utf-8"))
-                return contents
+            return list(read_options_with_cache(path, property_name, separator))
         else:
             return None
 
+def read_options_with_cache(filename, property_name, separator='/'):
+    """
+        Get the tuple of options for a property, split and encoded as UTF-8.
+        The tuple is cached alongside the properties it came from.
+    """
+    def load():
+        props = read_properties_file_with_cache(filename)
+        return split_options(props[property_name], separator)
+    return property_file_cache.get_or_load((filename, property_name, separator),
+                                           load,
+                                           path=filename,
+                                           cost=lambda options: sum(len(x) for x in options))
+
+def split_options(value, separator='/'):
+    # if we loaded from JSON this will already be a list
+    if isinstance(value, basestring):
+        contents = value.strip()
+        contents = contents.encode("utf-8")
+        return tuple(contents.split(separator))
+    else:
+        return tuple(x.strip().encode("utf-8") for x in value)
+
+def choose_text_option(dir_name, basename, language_code, property_name=None, separator='/'):
+    """
+        Pick one of the options that read_text_options would return at random
+        without building the list of options. Returns None if no options
+        can be found.
+    """
+    if property_name is None:
+        return choose_text_line(dir_name, basename, language_code)
+    language_code = check_language_code(language_code)
+    path = find_resource(dir_name, basename, language_code, [EXT_PROPERTIES, EXT_JSON ])
+    if path is None:
+        return None
+    options = read_options_with_cache(path, property_name, separator)
+    if not options:
+        return None
+    return random.choice(options)
+
+class Preloader(object):
+    """
+        Loads a set of resource files into the cache using background threads.
+        Use wait() to block until loading has finished and progress() to find
+        out how many files have been loaded so far. Files which fail to load
+        are recorded in errors rather than stopping the preload.
+    """
+    def __init__(self, paths, encoding="utf-8", workers=1):
+        super(Preloader, self).__init__()
+        self.paths = list(paths)
+        self.encoding = encoding
+        self.errors = {}
+        self.loaded = 0
+        self._lock = threading.Lock()
+        self._queue = Queue.Queue()
+        self._finished = threading.Event()
+        self._remaining = len(self.paths)
+        for path in self.paths:
+            self._queue.put(path)
+        if not self.paths:
+            self._finished.set()
+        self.threads = []
+        for _ in range(min(workers, len(self.paths))):
+            t = threading.Thread(target=self._run, name="naoutil.i18n.Preloader")
+            t.daemon = True
+            self.threads.append(t)
+
+    def start(self):
+        for t in self.threads:
+            t.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                path = self._queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                if path.endswith(EXT_TEXT):
+                    read_text_file_with_cache(path, self.encoding)
+                else:
+                    read_properties_file_with_cache(path, self.encoding)
+                error = None
+            except Exception as e:
+                error = e
+            with self._lock:
+                if error is None:
+                    self.loaded += 1
+                else:
+                    self.errors[path] = error
+                self._remaining -= 1
+                if self._remaining == 0:
+                    self._finished.set()
+
+    def done(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """
+            Wait for loading to finish, returns True if it has
+        """
+        self._finished.wait(timeout)
+        return self._finished.is_set()
+
+    def progress(self):
+        """
+            Returns the number of files processed so far and the total number of files
+        """
+        with self._lock:
+            return (len(self.paths) - self._remaining, len(self.paths))
+
+def find_preload_paths(dir_name, languages=None, basenames=None):
+    """
+        Find the resource files in dir_name for the given languages and
+        basenames, None meaning all of them
+    """
+    if not languages is None:
+        languages = set(check_language_code(lc) for lc in languages)
+    if not basenames is None:
+        basenames = set(basenames)
+    exts = (EXT_PROPERTIES, EXT_JSON, EXT_TEXT)
+    paths = set()
+    for (basename, language_code, ext), path in get_resource_index(dir_name).files.items():
+        if not ext in exts:
+            continue
+        if not languages is None and not language_code in languages:
+            continue
+        if not basenames is None and not basename in basenames:
+            continue
+        paths.add(path)
+    return sorted(paths)
+
+def preload(dir_name, languages=None, basenames=None, encoding="utf-8", workers=1):
+    """
+        Start loading the resource files in dir_name for the given languages
+        and basenames (all of them if None) into the cache in the background.
+        Returns the Preloader doing the work.
+    """
+    paths = find_preload_paths(dir_name, languages, basenames)
+    return Preloader(paths, encoding, workers).start()
+
+def reload_file(filename, encoding="utf-8"):
+    """
+        Load a new version of a file into the cache. The old version stays in
+        the cache until the new one has been loaded, if the new version
+        can't be loaded (for example because it is part way through being
+        written) the old version is kept and False is returned. If only
+        values derived from the file are cached, such as the line index of
+        a text file, they are dropped to be loaded again when next used.
+    """
+    if not filename in property_file_cache:
+        property_file_cache.invalidate_file(filename)
+        return True
+    signature = file_signature(filename)
+    try:
+        if filename.endswith(EXT_TEXT):
+            value = read_text_file(filename, encoding)
+        else:
+            value = load_properties_file(filename, encoding)
+    except (IOError, OSError, ValueError):
+        return False
+    property_file_cache.replace(filename, value, signature)
+    return True
+
+class ResourceWatcher(object):
+    """
+        Polls for changes to the cached files from a resources dir (or list
+        of dirs) and reloads just those files that have changed. Readers
+        continue to get the old version of a file until the new one has
+        been loaded. Files added to or removed from the dirs are picked up
+        by refreshing the resource index. While the watcher is running the
+        cache leaves changes to the files in its dirs to the watcher, so a
+        reader never reloads a file that is part way through being written.
+    """
+    def __init__(self, dir_name, interval=1.0, encoding="utf-8"):
+        super(ResourceWatcher, self).__init__()
+        if isinstance(dir_name, basestring):
+            dir_name = [ dir_name ]
+        self.dir_names = list(dir_name)
+        self.interval = interval
+        self.encoding = encoding
+        self.thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        for dir_name in self.dir_names:
+            property_file_cache.watch_dir(dir_name)
+        self._stopped.clear()
+        self.thread = threading.Thread(target=self._run, name="naoutil.i18n.ResourceWatcher")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if not self.thread is None:
+            self.thread.join()
+            self.thread = None
+            for dir_name in self.dir_names:
+                property_file_cache.unwatch_dir(dir_name)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        """
+            Check for changes once, returns the list of files reloaded
+        """
+        get_resource_index(self.dir_names).refresh_if_changed()
+        reloaded = []
+        for path in property_file_cache.changed_files():
+            if self._is_watched(path) and reload_file(path, self.encoding):
+                reloaded.append(path)
+        return reloaded
+
+    def _is_watched(self, path):
+        for dir_name in self.dir_names:
+            if path.startswith(os.path.join(dir_name, '')):
+                return True
+        return False
+
+def watch(dir_name, interval=1.0, encoding="utf-8"):
+    """
+        Start a ResourceWatcher reloading changed files from dir_name every
+        interval seconds. Call stop() on the returned watcher to stop it.
+    """
+    return ResourceWatcher(dir_name, interval, encoding).start()
+
 def get_property(dir_name, basename, language_code, property_name):
     """
         Read a localized value from a property file
@@ -179,3 +757,120 @@ def get_property(dir_name, basename, language_code, property_name):
         return contents.encode("utf-8")
     else:
         return None
+
+def get_properties(dir_name, basename, language_code, property_names, default=None):
+    """
+        Read several localized values from a property file at once, returning
+        a dict of property name to value. Properties missing from the file for
+        the requested language are looked up in the default language and if
+        still not found are given the value default.
+    """
+    global DEFAULT_LANGUAGE_CODE
+    exts = [ EXT_PROPERTIES, EXT_JSON ]
+    language_code = check_language_code(language_code)
+    path = find_resource(dir_name, basename, language_code, exts)
+    props = {} if path is None else read_properties_file_with_cache(path)
+    fallback_props = None
+    result = {}
+    for name in property_names:
+        value = props.get(name)
+        if value is None:
+            if fallback_props is None:
+                fallback_path = find_resource(dir_name, basename, DEFAULT_LANGUAGE_CODE, exts)
+                if fallback_path is None or fallback_path == path:
+                    fallback_props = {}
+                else:
+                    fallback_props = read_properties_file_with_cache(fallback_path)
+            value = fallback_props.get(name)
+        if value is None:
+            result[name] = default
+        elif isinstance(value, basestring):
+            result[name] = value.strip().encode("utf-8")
+        else:
+            result[name] = value
+    return result
+
+# result of loading one file with load_many, error is None or a description of the error
+# signature is the (mtime, size) of the file before it was parsed
+LoadResult = collections.namedtuple('LoadResult', ['path', 'properties', 'error', 'seconds', 'signature'])
+
+def _load_one(job):
+    (path, encoding) = job
+    signature = file_signature(path)
+    start = time.time()
+    try:
+        properties = read_properties_file(path, encoding)
+        error = None
+    except Exception as e:
+        properties = None
+        error = "{}: {}".format(type(e).__name__, e)
+    return LoadResult(path, properties, error, time.time() - start, signature)
+
+def load_many(paths, workers=None, encoding="utf-8"):
+    """
+        Parse a number of properties and JSON files using a pool of worker
+        processes, by default one per CPU. Returns a list of LoadResult in the
+        same order as paths. A file which fails to load doesn't stop the
+        others being loaded, its error is reported in its LoadResult.
+    """
+    jobs = [ (path, encoding) for path in paths ]
+    if workers == 1 or len(jobs) < 2:
+        return [ _load_one(job) for job in jobs ]
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(_load_one, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+def find_properties_files(paths):
+    """
+        Expand a list of files and directories into the properties and JSON
+        files they contain, searching directories recursively
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dir_name, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.endswith(EXT_PROPERTIES) or name.endswith(EXT_JSON):
+                        found.append(os.path.join(dir_name, name))
+        else:
+            found.append(path)
+    return found
+
+def main(argv=None):
+    """
+        Command line tool to check that resource files can be parsed and
+        optionally compile them, reporting how long each file took.
+    """
+    parser = argparse.ArgumentParser(prog="python -m naoutil.i18n",
+                                     description="Validate properties and JSON resource files")
+    parser.add_argument("paths", nargs="+", metavar="PATH",
+                        help="file or directory of files to validate")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("-e", "--encoding", default=DEFAULT_ENCODING)
+    parser.add_argument("-c", "--compile", action="store_true",
+                        help="write a compiled catalog for each valid file")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    results = load_many(find_properties_files(args.paths), args.workers, args.encoding)
+    elapsed = time.time() - start
+
+    errors = 0
+    for result in results:
+        if result.error is None:
+            print "OK    {:8.4f}s {}".format(result.seconds, result.path)
+            if args.compile:
+                write_catalog(catalog_filename(result.path), result.properties, result.signature)
+        else:
+            errors += 1
+            print "ERROR {:8.4f}s {}: {}".format(result.seconds, result.path, result.error)
+    print "{} files, {} errors, {:.4f}s parsing, {:.4f}s elapsed".format(
+        len(results), errors, sum(r.seconds for r in results), elapsed)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
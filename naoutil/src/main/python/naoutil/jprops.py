@@ -2,6 +2,10 @@
 # https://github.com/mgood/jprops
 #
 # 28/4/2012 Dave Snowdon modifed _unescape() to always return unicode
+# 18/10/2026 parse lines using string methods rather than a regex and per-character
+# loops where possible and escape using precompiled patterns, output is unchanged.
+# Added LazyProperties and loading from bytes
+import collections
 import re
 import string
 import time
@@ -14,32 +18,72 @@ def load_properties(fh, mapping=dict):
     Returns a dict (or provided mapping) of properties.
 
     :param fh: a readable file-like object
-    :param mapping: mapping type to load properties into
+    :param mapping: mapping type to load properties into, if LazyProperties
+        values are only unescaped when they are used
     """
+    if mapping is LazyProperties:
+        return LazyProperties.from_file(fh)
     return mapping(iter_properties(fh))
 
 
+def load_properties_from_bytes(data, encoding='utf-8', mapping=dict):
+    """
+    Reads properties from the entire contents of a Java .properties file.
+
+    The data is decoded in one go and split into lines in bulk, which is
+    quicker than reading through a decoding file object line by line.
+
+    :param data: a byte string or a buffer that can be sliced, such as an mmap
+    :param encoding: encoding used by the file
+    :param mapping: mapping type to load properties into, if LazyProperties
+        values are only unescaped when they are used
+    """
+    text = _decode(data, encoding)
+    if mapping is LazyProperties:
+        return LazyProperties(text)
+    return mapping(iter_properties(text.splitlines(True)))
+
+
+def iter_properties_from_bytes(data, encoding='utf-8'):
+    """
+    Incrementally read properties from the entire contents of a Java
+    .properties file.
+
+    Yields tuples of key/value pairs.
+
+    :param data: a byte string or a buffer that can be sliced, such as an mmap
+    :param encoding: encoding used by the file
+    """
+    return iter_properties(_decode(data, encoding).splitlines(True))
+
+
 def store_properties(fh, props, comment=None, timestamp=True):
     """
     Writes properties to the file in Java properties format.
 
+    The whole file is built in memory and written with a single call.
+
     :param fh: a writable file-like object
     :param props: a mapping (dict) or iterable of key/value pairs
     :param comment: comment to write to the beginning of the file
     :param timestamp: boolean indicating whether to write a timestamp comment
     """
+    lines = []
     if comment is not None:
-        write_comment(fh, comment)
+        lines.append(_escape_comment(comment))
 
     if timestamp:
-        write_comment(fh, time.strftime('%a %b %d %H:%M:%S %Z %Y'))
+        lines.append(_escape_comment(time.strftime('%a %b %d %H:%M:%S %Z %Y')))
 
     if hasattr(props, 'keys'):
-        for key in props:
-            write_property(fh, key, props[key])
+        items = ((key, props[key]) for key in props)
     else:
-        for key, value in props:
-            write_property(fh, key, value)
+        items = props
+    for key, value in items:
+        lines.append(_escape_key(key) + '=' + _escape_value(value))
+
+    lines.append('')
+    fh.write('\n'.join(lines))
 
 
 def write_comment(fh, comment):
@@ -89,7 +133,8 @@ def iter_properties(fh):
 
 
 _COMMENT_CHARS = '#!'
-_LINE_PATTERN = re.compile(r'^\s*(?P<body>.*?)(?P<backslashes>\\*)$')
+# characters matched by \s when not using re.UNICODE
+_LINE_WHITESPACE = ' \t\n\r\f\v'
 _KEY_TERMINATORS_EXPLICIT = '=:'
 _KEY_TERMINATORS = _KEY_TERMINATORS_EXPLICIT + string.whitespace
 
@@ -106,6 +151,8 @@ for c in '\\' + _COMMENT_CHARS + _KEY_TERMINATORS_EXPLICIT:
 
 
 def _unescape(value):
+    if not '\\' in value:
+        return value
 
     def unirepl(m):
         backslashes = m.group(1)
@@ -131,17 +178,21 @@ def _unescape(value):
     return re.sub(ur'\\(.)', bslashrepl, value)
 
 
+_COMMENT_NEWLINE_PATTERN = re.compile(r'\n(?![#!])')
+_COMMENT_UNICODE_PATTERN = re.compile(u'[\u0100-\uffff]')
+
+
 def _escape_comment(comment):
     comment = comment.replace('\r\n', '\n').replace('\r', '\n')
-    comment = re.sub(r'\n(?![#!])', '\n#', comment)
+    comment = _COMMENT_NEWLINE_PATTERN.sub('\n#', comment)
     if isinstance(comment, unicode):
-        comment = re.sub(u'[\u0100-\uffff]', _unicode_replace, comment)
+        comment = _COMMENT_UNICODE_PATTERN.sub(_unicode_replace, comment)
         comment = comment.encode('latin-1')
     return '#' + comment
 
 
 def _escape_key(key):
-    return _escape(key, _KEY_TERMINATORS)
+    return _KEY_ESCAPER(key)
 
 
 def _escape_value(value):
@@ -149,32 +200,90 @@ def _escape_value(value):
     if len(tail) < len(value):
         head = value[:-len(tail)]
         # escape any leading whitespace, but leave other spaces intact
-        return _escape(head, string.whitespace) + _escape(tail)
+        return _LEADING_WHITESPACE_ESCAPER(head) + _VALUE_ESCAPER(tail)
     else:
-        return _escape(value)
+        return _VALUE_ESCAPER(value)
+
+
+def _unicode_replace(m):
+    c = m.group(0)
+    return r'\u%.4x' % ord(c)
 
 
-def _escape(value, chars=''):
+# characters which are written as unicode escapes
+_UNICODE_ESCAPE_RANGE = u'\u0000-\u0019\u007f-\uffff'
+
+
+def _make_escaper(chars=''):
+    """
+    Build a function which escapes the characters that always need escaping,
+    the given extra characters and characters outside of latin-1 printable
+    range in a single pass. Returns the escaped value encoded as latin-1.
+    """
     escape_chars = set(_escapes_rev)
     escape_chars.update(chars)
-    escape_pattern = '[%s]' % re.escape(''.join(escape_chars))
+    pattern = re.compile(u'[%s%s]' % (re.escape(''.join(sorted(escape_chars))),
+                                      _UNICODE_ESCAPE_RANGE))
+    unicode_pattern = re.compile(u'[%s]' % _UNICODE_ESCAPE_RANGE)
+
+    # the replacement for each escaped character is the escape sequence with any
+    # characters in the unicode range replaced by a unicode escape
+    table = {}
+    for c in escape_chars:
+        table[c] = unicode_pattern.sub(_unicode_replace, _escapes_rev.get(c) or '\\' + c)
 
     def esc(m):
         c = m.group(0)
-        return _escapes_rev.get(c) or '\\' + c
-    value = re.sub(escape_pattern, esc, value)
+        try:
+            return table[c]
+        except KeyError:
+            return r'\u%.4x' % ord(c)
 
-    value = re.sub(u'[\u0000-\u0019\u007f-\uffff]', _unicode_replace, value)
+    def escape(value):
+        return pattern.sub(esc, value).encode('latin-1')
+    return escape
 
-    return value.encode('latin-1')
 
+_KEY_ESCAPER = _make_escaper(_KEY_TERMINATORS)
+_VALUE_ESCAPER = _make_escaper()
+_LEADING_WHITESPACE_ESCAPER = _make_escaper(string.whitespace)
 
-def _unicode_replace(m):
-    c = m.group(0)
-    return r'\u%.4x' % ord(c)
+
+def _decode(data, encoding):
+    if isinstance(data, unicode):
+        return data
+    if not isinstance(data, str):
+        data = data[:]
+    return data.decode(encoding)
 
 
 def _split_key_value(line):
+    # find the first key terminator, if there's no backslash before it then it
+    # can't have been escaped
+    idx = -1
+    end = len(line)
+    for c in _KEY_TERMINATORS:
+        i = line.find(c, 0, end)
+        if i >= 0:
+            idx = end = i
+    if line.find('\\', 0, end) >= 0:
+        return _split_escaped_key_value(line)
+
+    if idx < 0:
+        # no key terminator, key is full line & value is blank
+        return line, ''
+
+    value = line[idx + 1:].lstrip()
+    if not line[idx] in _KEY_TERMINATORS_EXPLICIT and value[:1] in _KEY_TERMINATORS_EXPLICIT:
+        value = value[1:].lstrip()
+
+    if idx == 0:
+        # match the type returned by _split_escaped_key_value for an empty key
+        return '', value
+    return line[:idx], value
+
+
+def _split_escaped_key_value(line):
     escaped = False
     key_buf = []
 
@@ -198,18 +307,31 @@ def _split_key_value(line):
 
 
 def _property_lines(fp):
+    for body, _ in _located_property_lines(fp):
+        yield body
+
+
+def _located_property_lines(fp):
+    """
+    Yields each logical line along with its offset from the start of the
+    file, or None for lines continued over more than one line of the file
+    """
     buf = []
+    pos = 0
     for line in fp:
-        m = _LINE_PATTERN.match(line)
+        start = pos
+        pos += len(line)
+        body = line.lstrip(_LINE_WHITESPACE)
+        if body[-1:] == '\n':
+            body = body[:-1]
 
-        body = m.group('body')
-        backslashes = m.group('backslashes')
+        stripped = body.rstrip('\\')
+        backslashes = len(body) - len(stripped)
 
-        if len(backslashes) % 2 == 0:
-            body += backslashes
+        if backslashes % 2 == 0:
             continuation = False
         else:
-            body += backslashes[:-1]
+            body = body[:-1]
             continuation = True
 
         if not body or body[0] in _COMMENT_CHARS:
@@ -218,5 +340,58 @@ def _property_lines(fp):
         buf.append(body)
 
         if not continuation:
-            yield ''.join(buf)
+            if len(buf) == 1:
+                yield body, start + len(line) - len(line.lstrip(_LINE_WHITESPACE))
+            else:
+                yield ''.join(buf), None
             buf = []
+
+
+class LazyProperties(collections.Mapping):
+    """
+    Read-only mapping of the properties in the text of a Java .properties
+    file. Loading only records where each value is in the text, values are
+    unescaped the first time they are looked up.
+
+    Can be passed as the mapping argument to load_properties.
+
+    :param text: contents of the properties file
+    """
+    def __init__(self, text):
+        self._text = text
+        self._raw = {}
+        self._values = {}
+        for body, offset in _located_property_lines(text.splitlines(True)):
+            key, value = _split_key_value(body)
+            if offset is None:
+                raw = value
+            else:
+                end = offset + len(body)
+                raw = (end - len(value), end)
+            key = _unescape(key)
+            self._raw[key] = raw
+            self._values.pop(key, None)
+
+    @classmethod
+    def from_file(cls, fh):
+        return cls(fh.read())
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            raw = self._raw[key]
+            if isinstance(raw, tuple):
+                raw = self._text[raw[0]:raw[1]]
+            value = _unescape(raw)
+            self._values[key] = value
+            return value
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __len__(self):
+        return len(self._raw)
+
+    def __contains__(self, key):
+        return key in self._raw
@@ -6,12 +6,27 @@ Created on Mar 19, 2013
 @author: dsnowdon
 '''
 
+import cPickle
+import functools
 import json
+import os
+import types
+from cStringIO import StringIO
 
 from general import object_to_FQCN, find_class
 
 CLASS_TAG = '__class__'
 VALUE_TAG = '__value__'
+# used when sharing references, see SharedRefJSONEncoder
+ID_TAG = '__id__'
+REF_TAG = '__ref__'
+
+# classes registered with a short type id to use in CLASS_TAG instead of the FQCN
+_type_id_by_class = {}
+_class_by_type_id = {}
+
+# class -> (tag, encode function) resolved once per class, see encoder_for_class
+_encoders = {}
 
 '''
 Functions for clients to call to serialise/unserialise from strings and files
@@ -20,62 +35,684 @@ Idea taken from http://getpython3.com/diveintopython3/serializing.html
 and generalised to allow helper functions to be part of the custom classes
 and avoid case statements
 '''
-def to_json_file(obj, fp):
+def to_json_file(obj, fp, share_refs=False):
     if not obj is None:
-        json.dump(obj, fp, default=to_json_helper)
+        if share_refs:
+            for chunk in SharedRefJSONEncoder(obj).iterencode(obj):
+                fp.write(chunk)
+        else:
+            json.dump(obj, fp, cls=ObjectJSONEncoder)
 
-def to_json_string(obj):
+def to_json_string(obj, share_refs=False):
     if obj is None:
         return ""
+    elif share_refs:
+        return SharedRefJSONEncoder(obj).encode(obj)
     else:
-        return json.dumps(obj, default=to_json_helper)
+        return json.dumps(obj, cls=ObjectJSONEncoder)
 
-def from_json_file(fp):
-    return json.load(fp, object_hook=from_json_helper)
+def from_json_file(fp, lazy=False, share_refs=False):
+    return resolve(json.load(fp, object_hook=_json_hook(lazy, share_refs)))
 
-def from_json_string(sv):
+def from_json_string(sv, lazy=False, share_refs=False):
     if sv is None or sv == "":
         return None
     else:
-        return json.loads(sv, object_hook=from_json_helper)
+        return resolve(json.loads(sv, object_hook=_json_hook(lazy, share_refs)))
+
+def _json_hook(lazy, share_refs):
+    if not lazy and not share_refs:
+        return from_json_helper
+    return functools.partial(from_json_helper, refs={} if share_refs else None, lazy=lazy)
+
+'''
+Streaming variants for documents too large to hold in memory at once.
+
+to_json_stream() writes a JSON array from any iterable, encoding each
+element incrementally, and from_json_stream() is a generator returning the
+elements of a top-level JSON array one at a time. to_json_lines() and
+from_json_lines() do the same using JSON Lines (one document per line).
+'''
+# number of characters to read from a stream at a time
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def to_json_stream(iterable, fp):
+    encoder = ObjectJSONEncoder()
+    fp.write('[')
+    separator = ''
+    for obj in iterable:
+        fp.write(separator)
+        for chunk in encoder.iterencode(obj):
+            fp.write(chunk)
+        separator = ', '
+    fp.write(']')
+
+def from_json_stream(fp, chunk_size=STREAM_CHUNK_SIZE):
+    stream = _JsonStreamReader(fp, chunk_size)
+    if stream.next_char() != '[':
+        raise ValueError("Expected a JSON array")
+    stream.pos += 1
+    if stream.next_char() == ']':
+        return
+    while True:
+        yield stream.next_value()
+        ch = stream.next_char()
+        stream.pos += 1
+        if ch == ']':
+            return
+        if ch != ',':
+            raise ValueError("Expected ',' or ']' at offset {}".format(stream.offset()))
+
+def to_json_lines(iterable, fp):
+    encoder = ObjectJSONEncoder()
+    for obj in iterable:
+        for chunk in encoder.iterencode(obj):
+            fp.write(chunk)
+        fp.write('\n')
+
+def from_json_lines(fp):
+    decoder = json.JSONDecoder(object_hook=from_json_helper)
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield decoder.decode(line)
+
+class _JsonStreamReader(object):
+    '''
+    Buffer over a file which decodes one JSON value at a time, reading more
+    of the file only when the value in the buffer is incomplete
+    '''
+    def __init__(self, fp, chunk_size):
+        super(_JsonStreamReader, self).__init__()
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder(object_hook=from_json_helper)
+        self.buf = ''
+        self.pos = 0
+        self.consumed = 0
+        self.eof = False
+
+    def offset(self):
+        return self.consumed + self.pos
+
+    def _read_more(self):
+        # drop what has already been decoded so the buffer doesn't grow
+        self.consumed += self.pos
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        # read at least as much as is buffered so a large value isn't
+        # re-scanned once per chunk
+        data = self.fp.read(max(self.chunk_size, len(self.buf)))
+        if data:
+            self.buf += data
+        else:
+            self.eof = True
+
+    def next_char(self):
+        '''
+        Skip whitespace and return the next character without consuming it,
+        or None at the end of the file
+        '''
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return None
+            self._read_more()
+
+    def next_value(self):
+        if self.next_char() is None:
+            raise ValueError("Unexpected end of JSON stream")
+        while True:
+            try:
+                (value, end) = self.decoder.raw_decode(self.buf, self.pos)
+                # a value ending at the end of the buffer may be truncated,
+                # for example a number, so only accept it once more is known
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self._read_more()
+
+'''
+Binary serialisation using the same to_json/from_json class methods and
+CLASS_TAG semantics as JSON, for data which is written and read often.
+
+The data is written with pickle's binary protocol, which codes each value
+with its type and length and is both faster to produce and parse and smaller
+than JSON text. Custom objects are stored as their (tag, to_json() value)
+pair rather than pickled, and reading refuses anything that would make
+pickle look up a class or function, so only classes reachable from a tag
+are ever created, just as with JSON. Unlike JSON, tuples, non string dict
+keys and str values are read back unchanged.
+'''
+BINARY_HEADER = "NAOJSB1"
+BINARY_PROTOCOL = 2
+
+def to_binary(obj):
+    fp = StringIO()
+    to_binary_file(obj, fp)
+    return fp.getvalue()
+
+def from_binary(data):
+    return from_binary_file(StringIO(data))
+
+def to_binary_file(obj, fp):
+    fp.write(BINARY_HEADER)
+    pickler = cPickle.Pickler(fp, BINARY_PROTOCOL)
+    # only called for objects which aren't of a builtin type
+    pickler.inst_persistent_id = _binary_object_id
+    pickler.dump(obj)
+
+def from_binary_file(fp):
+    if fp.read(len(BINARY_HEADER)) != BINARY_HEADER:
+        raise ValueError("Not binary jsonobj data")
+    unpickler = cPickle.Unpickler(fp)
+    unpickler.persistent_load = _binary_object_load
+    unpickler.find_global = None
+    return unpickler.load()
+
+def _binary_object_id(obj):
+    encoder = encoder_for_class(obj.__class__)
+    if not encoder is None:
+        (tag, to_json) = encoder
+        return (tag, to_json(obj))
+    # subclasses of the builtin types are stored as the base type, as json does
+    for base in (dict, list, tuple, str, unicode, bool, int, long, float):
+        if isinstance(obj, base):
+            return (None, base(obj))
+    raise TypeError(repr(obj) + ' is not JSON serializable')
+
+def _binary_object_load(object_id):
+    (tag, value) = object_id
+    if tag is None:
+        return value
+    return from_json_helper({CLASS_TAG: tag, VALUE_TAG: value})
+
+'''
+Register a class to be tagged with a short, stable type id rather than its
+FQCN. Type ids may not contain '.' so they can't be confused with a FQCN.
+Data tagged with the FQCN of a registered class can still be read.
+'''
+def register_type(klass, type_id):
+    if '.' in type_id:
+        raise ValueError("Type id {} must not contain '.'".format(type_id))
+    existing = _class_by_type_id.get(type_id)
+    if not existing is None and not existing is klass:
+        raise ValueError("Type id {} is already registered for {}".format(type_id, existing))
+    _class_by_type_id[type_id] = klass
+    _type_id_by_class[klass] = type_id
+    _encoders.pop(klass, None)
+
+'''
+Class decorator to register a class with a short type id, for example
+
+@json_type('pt')
+class Point(object):
+    ...
+'''
+def json_type(type_id):
+    def register(klass):
+        register_type(klass, type_id)
+        return klass
+    return register
+
+'''
+Get the value used in CLASS_TAG for an object, its type id if the class
+is registered otherwise its FQCN
+'''
+def object_to_tag(obj):
+    try:
+        return _type_id_by_class[obj.__class__]
+    except KeyError:
+        return object_to_FQCN(obj)
+
+'''
+Find the class for a value from CLASS_TAG
+'''
+def tag_to_class(tag):
+    try:
+        return _class_by_type_id[tag]
+    except KeyError:
+        return find_class(tag)
 
 '''
 Convenience function to generate dictionary in correct format
 '''
 def object_to_json(obj, value):
     if value is None:
-        return {CLASS_TAG: object_to_FQCN(obj) }
+        return {CLASS_TAG: object_to_tag(obj) }
     else:
-        return {CLASS_TAG: object_to_FQCN(obj),
+        return {CLASS_TAG: object_to_tag(obj),
                 VALUE_TAG: value}
 
+'''
+Get the (tag, encode) pair for a class, where encode(obj) returns the value
+to store under VALUE_TAG, or None if the class has no to_json method. The
+lookups are done once per class and cached, registering a type id for the
+class clears its entry.
+'''
+def encoder_for_class(klass):
+    try:
+        return _encoders[klass]
+    except KeyError:
+        pass
+    to_json = getattr(klass, 'to_json', None)
+    if to_json is None:
+        encoder = None
+    else:
+        tag = _type_id_by_class.get(klass)
+        if tag is None:
+            tag = klass.__module__ + '.' + klass.__name__
+        if not (isinstance(to_json, types.MethodType) and to_json.im_self is None):
+            # not a plain instance method so look it up on each object
+            to_json = _call_to_json
+        encoder = (tag, to_json)
+    _encoders[klass] = encoder
+    return encoder
+
+def _call_to_json(obj):
+    return obj.to_json()
+
 '''
 Helper method to generate JSON for custom classes
 '''
 def to_json_helper(python_object):
-    try:
-        method = getattr(python_object, 'to_json')
-        return object_to_json(python_object, method())
-    except AttributeError:
+    encoder = encoder_for_class(python_object.__class__)
+    if encoder is None:
         raise TypeError(repr(python_object) + ' is not JSON serializable')
+    (tag, to_json) = encoder
+    value = to_json(python_object)
+    if value is None:
+        return {CLASS_TAG: tag}
+    else:
+        return {CLASS_TAG: tag, VALUE_TAG: value}
+
+class ObjectJSONEncoder(json.JSONEncoder):
+    '''
+    JSONEncoder which serialises custom classes using their to_json method,
+    can be passed as cls to json.dump() and json.dumps()
+    '''
+    def default(self, obj):
+        return to_json_helper(obj)
+
+_SCALAR_TYPES = frozenset([str, unicode, int, long, float, bool, type(None)])
+
+class SharedRefJSONEncoder(ObjectJSONEncoder):
+    '''
+    ObjectJSONEncoder which writes a custom object referenced more than once
+    from root in full only the first time, tagged with ID_TAG, and writes
+    later occurrences as {REF_TAG: id}. from_json_string() and
+    from_json_file() called with share_refs set then return the same
+    instance for each occurrence. Used by to_json_string() and
+    to_json_file() when share_refs is set.
+
+    Objects are found by walking root before encoding, so the encoder can
+    only be used to encode root. Raises ValueError if an object contains
+    itself, since it couldn't be reconstituted.
+    '''
+    def __init__(self, root, **kwargs):
+        super(SharedRefJSONEncoder, self).__init__(**kwargs)
+        # id -> (object, tagged JSON) for every custom object, holding the
+        # object so that its id can't be reused while encoding
+        self._tagged = { }
+        self._shared = set()
+        self._refs = { }
+        self._scan(root, set())
+
+    def _scan(self, obj, enclosing):
+        t = type(obj)
+        if t in _SCALAR_TYPES:
+            return
+        if t is dict:
+            values = obj.itervalues()
+        elif t is list or t is tuple:
+            values = obj
+        elif isinstance(obj, (basestring, int, long, float)):
+            return
+        elif isinstance(obj, dict):
+            values = obj.itervalues()
+        elif isinstance(obj, (list, tuple)):
+            values = obj
+        else:
+            key = id(obj)
+            if key in enclosing:
+                raise ValueError("Circular reference to " + repr(obj))
+            if key in self._tagged:
+                self._shared.add(key)
+                return
+            tagged = to_json_helper(obj)
+            self._tagged[key] = (obj, tagged)
+            enclosing.add(key)
+            self._scan(tagged.get(VALUE_TAG), enclosing)
+            enclosing.discard(key)
+            return
+        for value in values:
+            self._scan(value, enclosing)
+
+    def default(self, obj):
+        key = id(obj)
+        entry = self._tagged.get(key)
+        if entry is None:
+            return to_json_helper(obj)
+        tagged = entry[1]
+        if key in self._shared:
+            ref = self._refs.get(key)
+            if not ref is None:
+                return {REF_TAG: ref}
+            ref = self._refs[key] = len(self._refs) + 1
+            tagged = dict(tagged)
+            tagged[ID_TAG] = ref
+        return tagged
 
 '''
 Helper function to detect serialized classes and call from_json on them
-to regenerate the class
+to regenerate the class. If refs is a dict, objects written with shared
+references are recorded in it by their id so that later references return
+the same object. If lazy is set, a LazyObject is returned in place of the
+object and from_json is only called when it is first used.
 '''
-def from_json_helper(json_object):
+def from_json_helper(json_object, refs=None, lazy=False):
     # check whether this is an object we serialised and tagged with the class name
     if CLASS_TAG in json_object:
-        fqcn = json_object[CLASS_TAG]
-        klass = find_class(fqcn)
+        klass = tag_to_class(json_object[CLASS_TAG])
+        ref = json_object.get(ID_TAG)
 
         # invoke from_json on target class
         try:
-            try:
-                json_object = getattr(klass, 'from_json')(json_object[VALUE_TAG])
-            except KeyError:
-                json_object = getattr(klass, 'from_json')(None)
+            if lazy:
+                json_object = LazyObject(klass, getattr(klass, 'from_json'), json_object.get(VALUE_TAG))
+            else:
+                try:
+                    json_object = getattr(klass, 'from_json')(json_object[VALUE_TAG])
+                except KeyError:
+                    json_object = getattr(klass, 'from_json')(None)
         except AttributeError:
             # class does not support being reconstituted from JSON
-            pass 
+            pass
+        if not ref is None and not refs is None:
+            refs[ref] = json_object
+    elif not refs is None and REF_TAG in json_object and len(json_object) == 1:
+        try:
+            json_object = refs[json_object[REF_TAG]]
+        except KeyError:
+            raise ValueError("Reference to unknown or enclosing object {}".format(json_object[REF_TAG]))
     return json_object
+
+_UNRESOLVED = object()
+
+class LazyObject(object):
+    '''
+    Stands in for an object read from JSON until it is used, when the class's
+    from_json is called to create it. Attribute access and the common
+    operators are passed on to the object and the proxy reports the class of
+    the object it stands for, so isinstance() works. Use resolve() to get
+    the object itself, for example to compare it with "is" or to call type().
+    Any error from from_json is raised when the object is first used.
+    '''
+    __slots__ = ('_lazy_class', '_lazy_from_json', '_lazy_value', '_lazy_target')
+
+    def __init__(self, klass, from_json, value):
+        object.__setattr__(self, '_lazy_class', klass)
+        object.__setattr__(self, '_lazy_from_json', from_json)
+        object.__setattr__(self, '_lazy_value', value)
+        object.__setattr__(self, '_lazy_target', _UNRESOLVED)
+
+    def _lazy_resolve(self):
+        target = self._lazy_target
+        if target is _UNRESOLVED:
+            target = self._lazy_from_json(self._lazy_value)
+            object.__setattr__(self, '_lazy_target', target)
+            # the JSON value is no longer needed
+            object.__setattr__(self, '_lazy_value', None)
+        return target
+
+    @property
+    def __class__(self):
+        return self._lazy_class
+
+    def __getattr__(self, name):
+        return getattr(self._lazy_resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._lazy_resolve(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._lazy_resolve(), name)
+
+    def __eq__(self, other):
+        return self._lazy_resolve() == resolve(other)
+
+    def __ne__(self, other):
+        return self._lazy_resolve() != resolve(other)
+
+    def __hash__(self):
+        return hash(self._lazy_resolve())
+
+    def __repr__(self):
+        return repr(self._lazy_resolve())
+
+    def __str__(self):
+        return str(self._lazy_resolve())
+
+    def __unicode__(self):
+        return unicode(self._lazy_resolve())
+
+    def __nonzero__(self):
+        return bool(self._lazy_resolve())
+
+    def __len__(self):
+        return len(self._lazy_resolve())
+
+    def __iter__(self):
+        return iter(self._lazy_resolve())
+
+    def __contains__(self, item):
+        return item in self._lazy_resolve()
+
+    def __getitem__(self, key):
+        return self._lazy_resolve()[key]
+
+    def __setitem__(self, key, value):
+        self._lazy_resolve()[key] = value
+
+    def __delitem__(self, key):
+        del self._lazy_resolve()[key]
+
+    def __call__(self, *args, **kwargs):
+        return self._lazy_resolve()(*args, **kwargs)
+
+'''
+Return the object a LazyObject stands for, or obj itself if it isn't one
+'''
+def resolve(obj):
+    if type(obj) is LazyObject:
+        return obj._lazy_resolve()
+    return obj
+
+'''
+Saving state which changes a little at a time. SnapshotWriter.save() writes
+a full checkpoint of the object the first time and afterwards appends only
+the differences from the previous save to the same file, rewriting it as a
+new checkpoint every checkpoint_interval saves. read_snapshot() rebuilds the
+object from the checkpoint and the differences.
+
+The file holds one JSON document per line, the checkpoint
+{"checkpoint": tree} followed by {"delta": [operation, ...]} lines, where
+tree is the JSON that to_json_string() would produce and each operation is
+["set", path, value] or ["del", path] with path the list of dict keys and
+list indexes leading to the value.
+'''
+DEFAULT_CHECKPOINT_INTERVAL = 50
+
+class SnapshotWriter(object):
+    def __init__(self, filename, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL):
+        super(SnapshotWriter, self).__init__()
+        self.filename = filename
+        self.checkpoint_interval = checkpoint_interval
+        self.deltas = 0
+        self._tree = None
+
+    def save(self, obj):
+        tree = to_json_tree(obj)
+        if self._tree is None or self.deltas >= self.checkpoint_interval:
+            self.checkpoint(tree)
+        else:
+            operations = []
+            diff_trees(self._tree, tree, [], operations)
+            if operations:
+                line = json.dumps({ 'delta' : operations }) + '\n'
+                try:
+                    with open(self.filename, "ab") as fp:
+                        fp.write(line)
+                except:
+                    # the file may now end with part of a line which would
+                    # no longer be the last, so start again from a checkpoint
+                    self._tree = None
+                    raise
+                self.deltas += 1
+            self._tree = tree
+
+    def checkpoint(self, tree):
+        # write to a temporary file and rename so that readers never see a partial checkpoint
+        tmp_filename = self.filename + ".tmp"
+        try:
+            with open(tmp_filename, "wb") as fp:
+                fp.write(json.dumps({ 'checkpoint' : tree }) + '\n')
+                fp.flush()
+                os.fsync(fp.fileno())
+            os.rename(tmp_filename, self.filename)
+        except:
+            self._tree = None
+            raise
+        self.deltas = 0
+        self._tree = tree
+
+def read_snapshot(filename):
+    '''
+    Return the object last saved by a SnapshotWriter. An incomplete last
+    line, left by a save that was interrupted, is ignored.
+    '''
+    tree = None
+    with open(filename, "rb") as fp:
+        lines = fp.readlines()
+    for (i, line) in enumerate(lines):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            if i == len(lines) - 1:
+                break
+            raise
+        if 'checkpoint' in record:
+            tree = record['checkpoint']
+        else:
+            for operation in record['delta']:
+                tree = apply_operation(tree, operation)
+    return _tree_to_objects(tree, None)
+
+def to_json_tree(obj):
+    '''
+    Return the tree of dicts, lists and plain values which to_json_string()
+    would write for obj, without going through JSON text. Containers are
+    always copied so that the tree doesn't change along with obj.
+    '''
+    t = type(obj)
+    if t is dict:
+        tree = {}
+        for (key, value) in obj.iteritems():
+            if not type(key) in _STRING_TYPES:
+                key = _json_key(key)
+            tree[key] = value if type(value) in _SCALAR_TYPES else to_json_tree(value)
+        return tree
+    if t is list or t is tuple:
+        return [value if type(value) in _SCALAR_TYPES else to_json_tree(value) for value in obj]
+    if t in _SCALAR_TYPES:
+        return obj
+    # subclasses of the builtin types are converted to the base type, as json does
+    if isinstance(obj, basestring):
+        return (str if isinstance(obj, str) else unicode)(obj)
+    if isinstance(obj, (int, long)):
+        return long(obj) if isinstance(obj, long) else int(obj)
+    if isinstance(obj, float):
+        return float(obj)
+    if isinstance(obj, (list, tuple)):
+        return to_json_tree(list(obj))
+    if isinstance(obj, dict):
+        return to_json_tree(dict(obj))
+    return to_json_tree(to_json_helper(obj))
+
+_STRING_TYPES = frozenset([str, unicode])
+
+def _json_key(key):
+    # dict keys are converted to strings the same way json does
+    if isinstance(key, basestring):
+        return key
+    if key is True:
+        return 'true'
+    if key is False:
+        return 'false'
+    if key is None:
+        return 'null'
+    if isinstance(key, float):
+        return repr(key)
+    if isinstance(key, (int, long)):
+        return str(key)
+    raise TypeError("key " + repr(key) + " is not a string")
+
+def diff_trees(old, new, path, operations):
+    '''
+    Append the operations which turn the JSON tree old into new
+    '''
+    if type(old) is dict and type(new) is dict:
+        for key in old:
+            if not key in new:
+                operations.append(['del', path + [key]])
+        for (key, value) in new.iteritems():
+            if key in old:
+                diff_trees(old[key], value, path + [key], operations)
+            else:
+                operations.append(['set', path + [key], value])
+    elif type(old) is list and type(new) is list:
+        common = min(len(old), len(new))
+        for i in xrange(common):
+            diff_trees(old[i], new[i], path + [i], operations)
+        for i in xrange(common, len(new)):
+            operations.append(['set', path + [i], new[i]])
+        for i in reversed(xrange(common, len(old))):
+            operations.append(['del', path + [i]])
+    elif type(old) is not type(new) or old != new:
+        operations.append(['set', path, new])
+
+def apply_operation(tree, operation):
+    '''
+    Apply an operation from diff_trees to tree and return the new tree
+    '''
+    path = operation[1]
+    if not path:
+        return operation[2] if operation[0] == 'set' else None
+    parent = tree
+    for key in path[:-1]:
+        parent = parent[key]
+    key = path[-1]
+    if operation[0] == 'del':
+        del parent[key]
+    elif type(parent) is list and key == len(parent):
+        parent.append(operation[2])
+    else:
+        parent[key] = operation[2]
+    return tree
+
+def _tree_to_objects(tree, refs):
+    # reconstitute tagged objects bottom up, as json's object_hook does
+    t = type(tree)
+    if t is dict:
+        for (key, value) in tree.items():
+            tree[key] = _tree_to_objects(value, refs)
+        return from_json_helper(tree, refs)
+    if t is list:
+        return [_tree_to_objects(value, refs) for value in tree]
+    return tree
@@ -8,18 +8,28 @@ so that clients do not need to pass around proxies and objects holding
 loggers. Instead code just passes around NaoEnvironment instances
 '''
 import inspect
+import json
 import os
 import logging
+import time
 
 from naoqi import ALProxy
 
 import i18n
+import memory
 
 SOURCE_DIR = "src"
 RESOURCE_DIR = "resources"
 DEFAULT_DATA_DIR_ROOT = "/home/nao"
 DEFAULT_DATA_DIR_NAME = "data"
 
+# number of seconds to remember the current language for if we are not tracking language changes
+DEFAULT_LANGUAGE_TTL = 10.0
+# ALMemory key the i18n cache statistics are published to
+CACHE_STATS_KEY = "naoutil/i18n/CacheStats"
+# ALMemory event raised when the text to speech language changes
+LANGUAGE_CHANGED_EVENT = "ALTextToSpeech/languageTTS"
+
 '''
 The short names are the ones used to generate python properties, so you can use env.tts instead of
 env.ALTextToSpeech
@@ -66,6 +76,11 @@ class NaoEnvironment(object):
         self.data_path = None
         self.proxyAddr = ipaddr
         self.proxyPort = port
+        self.language = None
+        self.language_time = 0
+        self.language_ttl = DEFAULT_LANGUAGE_TTL
+        self.language_event = None
+        self.preloader = None
         self.logger = logging.getLogger("naoutil.naoenv.NaoEnvironment")
         # construct the set of proxies, ensuring that we use only valid long names
         self.proxies = { }
@@ -107,6 +122,12 @@ class NaoEnvironment(object):
     def set_resources_dir(self, dir_name):
         self.resources_path = dir_name
 
+    # start loading the localized resources into the cache in the background, returns
+    # an i18n.Preloader that can be used to wait for loading to finish
+    def preload_resources(self, languages=None, basenames=None):
+        self.preloader = i18n.preload(self.resources_dir(), languages, basenames)
+        return self.preloader
+
     def data_dir(self):
         if self.data_path is None:
             if not self.application_name() is None:
@@ -126,8 +147,41 @@ class NaoEnvironment(object):
     def set_data_dir(self, dir_name):
         self.data_path = dir_name
 
+    # the language is remembered to avoid a call to ALTextToSpeech on every lookup of
+    # localized text, until it expires or we are told that the language has changed
     def current_language(self):
-        return self.tts.getLanguage()
+        language = self.language
+        now = time.time()
+        if language is None or \
+                (not self.language_ttl is None and now - self.language_time >= self.language_ttl):
+            language = self.tts.getLanguage()
+            self.language = language
+            self.language_time = now
+        return language
+
+    # set how long the current language is remembered for, None means until invalidated
+    def set_language_ttl(self, ttl):
+        self.language_ttl = ttl
+
+    def invalidate_language(self):
+        self.language = None
+
+    # subscribe to the ALMemory event raised when the language changes, so the current language
+    # can be remembered until it changes rather than for a fixed time
+    def track_language_changes(self, event_name=LANGUAGE_CHANGED_EVENT):
+        memory.subscribe_to_event(event_name, self._on_language_changed)
+        self.language_event = event_name
+        self.language_ttl = None
+        self.invalidate_language()
+
+    def stop_tracking_language_changes(self):
+        if not self.language_event is None:
+            memory.unsubscribe_to_event(self.language_event)
+            self.language_event = None
+            self.language_ttl = DEFAULT_LANGUAGE_TTL
+
+    def _on_language_changed(self, data_name, value, message):
+        self.invalidate_language()
 
     # return the two letter ISO language code for the current language
     def current_language_code(self):
@@ -143,26 +197,42 @@ class NaoEnvironment(object):
                           .format(name=property_name, value=lt, lang=language_code))
         return lt
 
+    # look up several localized strings at once, returns a dict of property name to text
+    def localized_texts(self, basename, property_names, default=None):
+        language_code = self.current_language_code()
+        texts = i18n.get_properties(self.resources_dir(),
+                                    basename,
+                                    language_code,
+                                    property_names,
+                                    default)
+        self.logger.debug("Resolved {count} properties from '{basename}' in language '{lang}'"
+                          .format(count=len(texts), basename=basename, lang=language_code))
+        return texts
+
+    # store the i18n cache statistics in ALMemory as a JSON string
+    def publish_cache_stats(self, key=CACHE_STATS_KEY):
+        stats = i18n.cache_stats()
+        self.memory.insertData(key, json.dumps(stats))
+        return stats
+
     # read the named property from the specified config file. The file extension does not need
     # to be specified - both java style .properties & .json files will work
     def get_property(self, basename, propertyName, defaultValue=None):
-        dir_name = self.resources_dir()
-        for ext in [i18n.EXT_PROPERTIES, i18n.EXT_JSON ]:
-            filename = basename + ext
-            path = os.path.join(dir_name, filename)
-            if i18n.get_from_cache(path) or os.path.exists(path):
-                try:
-                    props = i18n.read_properties_file_with_cache(path)
-                    contents = props[propertyName]
-                    if isinstance(contents, basestring):
-                        return contents.encode("utf-8").strip()
-                    else:
-                        return contents
-                except KeyError:
-                    # property was not found
-                    return defaultValue
-        # property file was not found
-        return defaultValue
+        path = i18n.find_resource(self.resources_dir(), basename, None,
+                                  [i18n.EXT_PROPERTIES, i18n.EXT_JSON ])
+        if path is None:
+            # property file was not found
+            return defaultValue
+        try:
+            props = i18n.read_properties_file_with_cache(path)
+            contents = props[propertyName]
+            if isinstance(contents, basestring):
+                return contents.encode("utf-8").strip()
+            else:
+                return contents
+        except KeyError:
+            # property was not found
+            return defaultValue
 
     # simulate having properties for all proxies without having to manually create each one
     def __getattr__(self, name):
@@ -196,7 +266,11 @@ class NaoEnvironment(object):
 '''
 Create environment object.
 Needs to be called from a process with an ALBroker running (for example
-within choreographe code)
+within choreographe code). If preload is True the resources are loaded in
+the background so that the first lookup of localized text is fast.
 '''
-def make_environment(box_, proxies={}, ipaddr=None, port=None):
-    return NaoEnvironment(box_, proxies, ipaddr, port)
+def make_environment(box_, proxies={}, ipaddr=None, port=None, preload=False):
+    env = NaoEnvironment(box_, proxies, ipaddr, port)
+    if preload:
+        env.preload_resources()
+    return env
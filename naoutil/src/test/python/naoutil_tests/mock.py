@@ -34,10 +34,13 @@ class MockMotion(object):
         return [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
 
 class MockTextToSpeech(object):
-    def __init__(self):
+    def __init__(self, language="English"):
         super(MockTextToSpeech, self).__init__()
+        self.language = language
+        self.get_language_calls = 0
     def getLanguage(self):
-        return "English"
+        self.get_language_calls += 1
+        return self.language
 
 def make_mock_environment():
     return NaoEnvironment(MockBox(),
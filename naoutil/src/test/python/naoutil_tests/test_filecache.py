@@ -0,0 +1,186 @@
+'''
+Created on Oct 18, 2026
+
+'''
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from naoutil.filecache import FileCache
+
+def write_file(path, contents):
+    with open(path, 'w') as fp:
+        fp.write(contents)
+
+class TestFileCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_file(self, name, contents):
+        path = os.path.join(self.tmpdir, name)
+        write_file(path, contents)
+        return path
+
+    def test_get_missing(self):
+        cache = FileCache()
+        self.assertIsNone(cache.get('/does/not/exist'))
+
+    def test_evicts_least_recently_used(self):
+        cache = FileCache(max_entries=2)
+        a = self.make_file('a', 'aaa')
+        b = self.make_file('b', 'bbb')
+        c = self.make_file('c', 'ccc')
+        cache.put(a, 'A')
+        cache.put(b, 'B')
+        # touch a so that b becomes the oldest entry
+        self.assertEqual('A', cache.get(a))
+        cache.put(c, 'C')
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get(b))
+        self.assertEqual('A', cache.get(a))
+        self.assertEqual('C', cache.get(c))
+
+    def test_derived_entries_dont_count_as_files(self):
+        cache = FileCache(max_entries=2)
+        a = self.make_file('a', 'aaa')
+        b = self.make_file('b', 'bbb')
+        cache.put(a, 'A')
+        cache.put(b, 'B')
+        for i in range(10):
+            cache.put((a, i), i, path=a, cost=1)
+        self.assertEqual('A', cache.get(a))
+        self.assertEqual('B', cache.get(b))
+        self.assertEqual(12, len(cache))
+
+    def test_evicts_on_byte_budget(self):
+        cache = FileCache(max_bytes=10)
+        a = self.make_file('a', 'x' * 6)
+        b = self.make_file('b', 'y' * 6)
+        cache.put(a, 'A')
+        cache.put(b, 'B')
+        self.assertEqual(1, len(cache))
+        self.assertEqual(6, cache.total_bytes)
+        self.assertEqual('B', cache.get(b))
+
+    def test_modified_file_is_invalidated(self):
+        cache = FileCache(check_interval=0)
+        a = self.make_file('a', 'first')
+        cache.put(a, 'first')
+        write_file(a, 'second version')
+        self.assertIsNone(cache.get(a))
+        self.assertEqual(0, len(cache))
+
+    def test_modification_not_checked_within_interval(self):
+        cache = FileCache(check_interval=3600)
+        a = self.make_file('a', 'first')
+        cache.put(a, 'first')
+        write_file(a, 'second version')
+        self.assertEqual('first', cache.get(a))
+
+    def test_watched_dir_not_revalidated(self):
+        cache = FileCache(check_interval=0)
+        a = self.make_file('a', 'first')
+        cache.put(a, 'first')
+        cache.watch_dir(self.tmpdir)
+        write_file(a, 'second version')
+        self.assertEqual('first', cache.get(a))
+        self.assertEqual([a], cache.changed_files())
+        cache.unwatch_dir(self.tmpdir)
+        self.assertIsNone(cache.get(a))
+
+    def test_deleted_file_still_served(self):
+        cache = FileCache(check_interval=0)
+        a = self.make_file('a', 'first')
+        cache.put(a, 'first')
+        os.remove(a)
+        self.assertEqual('first', cache.get(a))
+
+    def test_derived_entries_invalidated_with_file(self):
+        cache = FileCache(check_interval=0)
+        a = self.make_file('a', 'first')
+        cache.put(a, 'first')
+        cache.put((a, 'derived'), 'FIRST', path=a)
+        write_file(a, 'second version')
+        self.assertIsNone(cache.get(a))
+        self.assertNotIn((a, 'derived'), cache)
+
+    def test_changed_files_includes_derived_entries(self):
+        cache = FileCache()
+        a = self.make_file('a', 'first')
+        cache.put((a, 'derived'), 'FIRST', path=a)
+        write_file(a, 'second version')
+        self.assertEqual([a], cache.changed_files())
+
+    def test_get_or_load_caches(self):
+        cache = FileCache()
+        a = self.make_file('a', 'first')
+        self.assertEqual('A', cache.get_or_load(a, lambda: 'A'))
+        self.assertEqual('A', cache.get_or_load(a, lambda: 'B'))
+
+    def test_file_changed_while_loading(self):
+        cache = FileCache(check_interval=0)
+        a = self.make_file('a', 'partial')
+        def loader():
+            # the rest of the file is written after it has been read
+            write_file(a, 'partial and the rest')
+            return 'partial'
+        self.assertEqual('partial', cache.get_or_load(a, loader))
+        self.assertEqual([a], cache.changed_files())
+        self.assertEqual('complete', cache.get_or_load(a, lambda: 'complete'))
+
+    def test_get_or_load_single_flight(self):
+        cache = FileCache()
+        a = self.make_file('a', 'first')
+        calls = []
+        def loader():
+            calls.append(1)
+            time.sleep(0.1)
+            return object()
+        results = []
+        def worker():
+            results.append(cache.get_or_load(a, loader))
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(1, len(calls))
+        self.assertEqual(5, len(results))
+        for r in results:
+            self.assertIs(results[0], r)
+
+    def test_get_or_load_error_not_cached(self):
+        cache = FileCache()
+        a = self.make_file('a', 'first')
+        def failing_loader():
+            raise IOError("cannot read")
+        self.assertRaises(IOError, cache.get_or_load, a, failing_loader)
+        self.assertEqual('A', cache.get_or_load(a, lambda: 'A'))
+
+    def test_stats(self):
+        cache = FileCache()
+        a = self.make_file('a', 'first')
+        self.assertIsNone(cache.get(a))
+        cache.get_or_load(a, lambda: 'A')
+        cache.get_or_load(a, lambda: 'A')
+        stats = cache.stats()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(2, stats['misses'])
+        self.assertEqual(1, stats['loads'])
+        self.assertEqual(1, stats['entries'])
+        self.assertEqual(5, stats['bytes'])
+        self.assertEqual(5, stats['paths'][a]['bytes'])
+        self.assertEqual(1, stats['paths'][a]['loads'])
+        cache.reset_stats()
+        self.assertEqual(0, cache.stats()['hits'])
+        self.assertEqual(5, cache.stats()['bytes'])
+
+if __name__ == '__main__':
+    unittest.main()
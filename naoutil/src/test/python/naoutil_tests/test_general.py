@@ -26,6 +26,29 @@ class TestFreeFunctions(unittest.TestCase):
 
     def test_find_class(self):
         self.assertIsNotNone(find_class('naoutil_tests.test_jsonobj.JsonTestBase'))
+
+    def test_find_class_is_cached(self):
+        invalidate_class_cache()
+        klass = find_class('naoutil_tests.test_general.Outer')
+        self.assertIs(Outer, klass)
+        self.assertIs(klass, find_class('naoutil_tests.test_general.Outer'))
+        invalidate_class_cache('naoutil_tests.test_general')
+        self.assertIs(Outer, find_class('naoutil_tests.test_general.Outer'))
+
+    def test_find_nested_class(self):
+        self.assertIs(Outer.Inner, find_class('naoutil_tests.test_general.Outer.Inner'))
+
+    def test_find_class_not_found(self):
+        self.assertRaises(TypeError, find_class, 'naoutil_tests.test_general.DoesNotExist')
+        self.assertRaises(TypeError, find_class, 'no_such_module.Foo')
+        self.assertRaises(TypeError, find_class, 'naoutil_tests.test_general.helper_function')
+
+def helper_function():
+    pass
+
+class Outer(object):
+    class Inner(object):
+        pass
         
 @singleton
 class MySingleton(object):
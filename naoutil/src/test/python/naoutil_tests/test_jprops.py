@@ -0,0 +1,169 @@
+# -*- coding: utf8 -*-
+'''
+Created on Oct 18, 2026
+
+'''
+
+import codecs
+import inspect
+import mmap
+import os
+import StringIO
+import unittest
+
+from naoutil import jprops
+
+'''
+Property file text and the key/value pairs that iter_properties produced for
+it before the line parsing was reworked. The parser must keep producing
+exactly the same output, including the odd cases such as the handling of
+comment-like continuation lines.
+'''
+CORPUS = [
+    (u'key=value\n',
+     [(u'key', u'value')]),
+    (u'key = value\n',
+     [(u'key', u'value')]),
+    (u'key:value\n',
+     [(u'key', u'value')]),
+    (u'key value\n',
+     [(u'key', u'value')]),
+    (u'key\t=\tvalue\n',
+     [(u'key', u'value')]),
+    (u'   leading=space\n',
+     [(u'leading', u'space')]),
+    (u'# comment\n! other comment\nkey=value\n',
+     [(u'key', u'value')]),
+    (u'\n   \n\t\nkey=value\n\n',
+     [(u'key', u'value')]),
+    (u'key=first \\\n    second\n',
+     [(u'key', u'first second')]),
+    (u'key=a\\\\\nnext=b\n',
+     [(u'key', u'a\\'), (u'next', u'b')]),
+    (u'a\\=b=c\n',
+     [(u'a=b', u'c')]),
+    (u'a\\:b:c\n',
+     [(u'a:b', u'c')]),
+    (u'a\\ b c\n',
+     [(u'a b', u'c')]),
+    (u'a\\\\=b\n',
+     [(u'a\\=b', '')]),
+    (u'k=\\u00e9t\\u00e9\n',
+     [(u'k', u'\xe9t\xe9')]),
+    (u'k=\\u005c\\u005cn\n',
+     [(u'k', u'\\\\\\n')]),
+    (u'k=\\\\u00e9\n',
+     [(u'k', u'\\u00e9')]),
+    (u'k=tab\\there\\nnew\\rline\\fx\\qy\n',
+     [(u'k', u'tab\there\nnew\rline\x0cxqy')]),
+    (u'justkey\n',
+     [(u'justkey', '')]),
+    (u'k==v\n',
+     [(u'k', u'=v')]),
+    (u'k :v\n',
+     [(u'k', u'v')]),
+    (u'k = = v\n',
+     [(u'k', u'= v')]),
+    (u'k=v\r\nk2=v2\r\n',
+     [(u'k', u'v\r'), (u'k2', u'v2\r')]),
+    (u'cl\xe9=\xe9t\xe9\n',
+     [(u'cl\xe9', u'\xe9t\xe9')]),
+    (u'k=\n',
+     [(u'k', u'')]),
+    (u'# comment \\\nk=v\n',
+     [(u'k', u'v')]),
+    (u'k=a\\\n#notcomment\nk2=b\n',
+     [(u'k', u'ak2=b')]),
+    (u'k=v\\',
+     []),
+    (u'k=v',
+     [(u'k', u'v')]),
+    (u'k=  leading and trailing  \n',
+     [(u'k', u'leading and trailing  ')]),
+    (u'k\\u0041y=v\n',
+     [(u'kAy', u'v')]),
+    (u'hello=\u4f60\u597d\n',
+     [(u'hello', u'\u4f60\u597d')]),
+]
+
+class TestIterProperties(unittest.TestCase):
+    def test_corpus(self):
+        for text, expected in CORPUS:
+            actual = list(jprops.iter_properties(text.splitlines(True)))
+            self.assertEqual(expected, actual, "Parsing " + repr(text))
+            self.assertEqual([(type(k), type(v)) for k, v in expected],
+                             [(type(k), type(v)) for k, v in actual],
+                             "Types from parsing " + repr(text))
+
+    def test_load_properties(self):
+        props = jprops.load_properties(u'a=1\nb = 2\n'.splitlines(True))
+        self.assertEqual({ u'a' : u'1', u'b' : u'2' }, props)
+
+class TestLoadFromBytes(unittest.TestCase):
+    def setUp(self):
+        self.resources_path = os.path.dirname(inspect.getfile(inspect.currentframe())) + "/../../../../resources"
+
+    def test_same_as_file_reader(self):
+        for name in os.listdir(self.resources_path):
+            if not name.endswith('.properties'):
+                continue
+            path = os.path.join(self.resources_path, name)
+            with codecs.open(path, encoding='utf-8') as fp:
+                expected = jprops.load_properties(fp)
+            with open(path, 'rb') as fp:
+                data = fp.read()
+            self.assertEqual(expected, jprops.load_properties_from_bytes(data))
+            self.assertEqual(expected, dict(jprops.iter_properties_from_bytes(data)))
+
+    def test_mmap(self):
+        path = os.path.join(self.resources_path, 'defaults_zh.properties')
+        with open(path, 'rb') as fp:
+            data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            props = jprops.load_properties_from_bytes(data)
+        finally:
+            data.close()
+        self.assertEqual(u'\u4f60\u597d', props[u'hello'])
+
+    def test_lazy(self):
+        props = jprops.load_properties_from_bytes('a=caf\xc3\xa9\n', mapping=jprops.LazyProperties)
+        self.assertEqual(u'caf\xe9', props[u'a'])
+
+class TestStoreProperties(unittest.TestCase):
+    def test_escaping(self):
+        fh = StringIO.StringIO()
+        jprops.store_properties(fh, [(u'a key=:', u'  value\twith\n\xe9\u4f60')],
+                                comment=u'line one\nline two', timestamp=False)
+        self.assertEqual('#line one\n#line two\n'
+                         'a\\ key\\=\\:=\\ \\ value\\twith\\n\\u00e9\\u4f60\n',
+                         fh.getvalue())
+
+    def test_round_trip(self):
+        props = { u'key' : u'value', u'caf\xe9' : u'\u4f60\u597d', u'a b' : u' x:y=z\\ ' }
+        fh = StringIO.StringIO()
+        jprops.store_properties(fh, props)
+        fh.seek(0)
+        self.assertEqual(props, jprops.load_properties(fh))
+
+class TestLazyProperties(unittest.TestCase):
+    def test_corpus(self):
+        for text, expected in CORPUS:
+            props = jprops.LazyProperties(text)
+            self.assertEqual(dict(expected), dict((k, props[k]) for k in props), "Parsing " + repr(text))
+
+    def test_values_unescaped_on_access(self):
+        props = jprops.LazyProperties(u'a=caf\\u00e9\nb=x\\\n  y\n')
+        self.assertEqual(2, len(props))
+        self.assertEqual({}, props._values)
+        self.assertEqual(u'caf\xe9', props['a'])
+        self.assertEqual([u'a'], props._values.keys())
+        self.assertEqual(u'xy', props['b'])
+        self.assertRaises(KeyError, lambda: props['c'])
+
+    def test_mapping_argument(self):
+        props = jprops.load_properties(StringIO.StringIO(u'a=1\nb = 2\n'), jprops.LazyProperties)
+        self.assertTrue(isinstance(props, jprops.LazyProperties))
+        self.assertEqual({ u'a' : u'1', u'b' : u'2' }, dict(props))
+
+if __name__ == '__main__':
+    unittest.main()
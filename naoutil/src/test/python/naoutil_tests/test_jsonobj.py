@@ -4,9 +4,15 @@ Created on Mar 19, 2013
 @author: dns
 '''
 
+import json
+import os
+import shutil
+import tempfile
 import unittest
+from StringIO import StringIO
 
-from naoutil.general import object_to_name
+from naoutil.general import object_to_name, object_to_FQCN
+from naoutil import jsonobj
 from naoutil.jsonobj import *
 
 '''
@@ -71,6 +77,35 @@ class JsonSubClass(JsonWithData):
     def from_json(klass, json_object):
         return klass(json_object['source'], json_object['sensorData'], json_object['name'])
 
+# class registered with a short type id
+@json_type('jtr')
+class JsonTypeRegistered(JsonWithData):
+    def __init__(self, source, sensorData):
+        super(JsonTypeRegistered, self).__init__(source, sensorData)
+
+class TestTypeRegistry(unittest.TestCase):
+    def test_compact_tag(self):
+        b = JsonTypeRegistered('foo', [1, 2])
+        self.assertEqual({ CLASS_TAG : 'jtr', VALUE_TAG : { 'source' : 'foo', 'sensorData' : [1, 2] } },
+                         json.loads(to_json_string(b)))
+        self.assertEqual(b, from_json_string(to_json_string(b)))
+
+    def test_fqcn_still_decodes(self):
+        sv = '{"__class__": "naoutil_tests.test_jsonobj.JsonTypeRegistered", ' \
+             '"__value__": {"source": "foo", "sensorData": 3}}'
+        rev = from_json_string(sv)
+        self.assertTrue(isinstance(rev, JsonTypeRegistered))
+        self.assertEqual(JsonTypeRegistered('foo', 3), rev)
+
+    def test_subclass_uses_fqcn(self):
+        class Unregistered(JsonTypeRegistered):
+            pass
+        self.assertEqual(object_to_FQCN(Unregistered('a', 1)), object_to_tag(Unregistered('a', 1)))
+
+    def test_invalid_registration(self):
+        self.assertRaises(ValueError, register_type, JsonNoData, 'jtr')
+        self.assertRaises(ValueError, register_type, JsonNoData, 'with.dot')
+
 class TestJson(unittest.TestCase):
     def test_json_serialise_base(self):
         b = JsonTestBase()
@@ -103,5 +138,305 @@ class TestJson(unittest.TestCase):
     def test_none(self):
         self.assertIsNone(from_json_string(None), "None should return None")
 
+class TestEncoderCache(unittest.TestCase):
+    def test_encoder_cached_per_class(self):
+        encoder = encoder_for_class(JsonWithData)
+        self.assertEqual(object_to_FQCN(JsonWithData('a', 1)), encoder[0])
+        self.assertIs(encoder, encoder_for_class(JsonWithData))
+
+    def test_registration_clears_encoder(self):
+        class LateRegistered(JsonNoData):
+            pass
+        self.assertEqual(object_to_FQCN(LateRegistered()), encoder_for_class(LateRegistered)[0])
+        register_type(LateRegistered, 'late_registered')
+        self.assertEqual('late_registered', encoder_for_class(LateRegistered)[0])
+        self.assertEqual({ CLASS_TAG : 'late_registered', VALUE_TAG : { } },
+                         json.loads(to_json_string(LateRegistered())))
+
+    def test_not_serializable(self):
+        self.assertIsNone(encoder_for_class(object))
+        self.assertRaises(TypeError, to_json_string, object())
+
+    def test_object_json_encoder(self):
+        b = JsonWithData('foo', [JsonNoData()])
+        self.assertEqual(to_json_string(b), json.dumps(b, cls=ObjectJSONEncoder))
+        self.assertEqual(b, from_json_string(json.dumps(b, cls=ObjectJSONEncoder)))
+
+class TestBinary(unittest.TestCase):
+    def test_round_trip(self):
+        for ev in [ JsonNoData(),
+                    JsonWithData('foo', { 'a': 123, 'b' : [456, 1.5, u'caf\xe9', None, True] }),
+                    JsonSubClass('bar', JsonTypeRegistered('baz', -3), 'name'),
+                    { 'list' : [JsonNoData(), JsonNoData()] },
+                    'plain string',
+                    None ]:
+            self.assertEqual(ev, from_binary(to_binary(ev)))
+
+    def test_same_objects_as_json(self):
+        ev = JsonWithData('foo', [JsonSubClass('bar', 1, 'n'), { 'x' : JsonNoData() }])
+        rev = from_binary(to_binary(ev))
+        self.assertEqual(from_json_string(to_json_string(ev)), rev)
+        self.assertTrue(isinstance(rev.sensorData[0], JsonSubClass))
+
+    def test_builtin_subclasses(self):
+        class MyDict(dict):
+            pass
+        rev = from_binary(to_binary(MyDict(a=1)))
+        self.assertEqual({ 'a' : 1 }, rev)
+        self.assertIs(dict, type(rev))
+
+    def test_not_serializable(self):
+        self.assertRaises(TypeError, to_binary, object())
+
+    def test_files(self):
+        ev = JsonWithData('foo', [1, 2])
+        fp = StringIO()
+        to_binary_file(ev, fp)
+        fp.seek(0)
+        self.assertEqual(ev, from_binary_file(fp))
+
+    def test_rejects_other_data(self):
+        self.assertRaises(ValueError, from_binary, to_json_string([1, 2]))
+
+    def test_rejects_pickled_classes(self):
+        import cPickle
+        data = BINARY_HEADER + cPickle.dumps(JsonNoData(), BINARY_PROTOCOL)
+        self.assertRaises(cPickle.UnpicklingError, from_binary, data)
+
+class TestSharedRefs(unittest.TestCase):
+    def test_shared_object_restored_once(self):
+        shared = JsonWithData('shared', [1, 2, 3])
+        ev = { 'a' : shared, 'b' : [shared, JsonWithData('other', shared)] }
+        sv = to_json_string(ev, share_refs=True)
+        self.assertEqual(1, sv.count('"shared"'))
+        rev = from_json_string(sv, share_refs=True)
+        self.assertEqual(shared, rev['a'])
+        self.assertIs(rev['a'], rev['b'][0])
+        self.assertIs(rev['a'], rev['b'][1].sensorData)
+
+    def test_off_by_default(self):
+        shared = JsonNoData()
+        rev = from_json_string(to_json_string([shared, shared]))
+        self.assertEqual(rev[0], rev[1])
+        self.assertIsNot(rev[0], rev[1])
+
+    def test_unshared_objects_not_tagged(self):
+        sv = to_json_string([JsonNoData(), JsonNoData()], share_refs=True)
+        self.assertEqual(to_json_string([JsonNoData(), JsonNoData()]), sv)
+
+    def test_file(self):
+        shared = JsonNoData()
+        fp = StringIO()
+        to_json_file([shared, shared], fp, share_refs=True)
+        fp.seek(0)
+        rev = from_json_file(fp, share_refs=True)
+        self.assertIs(rev[0], rev[1])
+
+    def test_circular_reference(self):
+        ev = JsonWithData('loop', None)
+        ev.sensorData = [ev]
+        self.assertRaises(ValueError, to_json_string, ev, True)
+
+    def test_unknown_reference(self):
+        self.assertRaises(ValueError, from_json_string, '[{"__ref__": 1}]', share_refs=True)
+
+    def test_refs_ignored_by_default(self):
+        self.assertEqual([{ '__ref__' : 1 }], from_json_string('[{"__ref__": 1}]'))
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_lines(self):
+        with open(self.filename) as fp:
+            return [json.loads(line) for line in fp]
+
+    def test_deltas_rebuild_state(self):
+        writer = SnapshotWriter(self.filename)
+        state = { 'count' : 0, 'items' : [1, 2, 3], 'data' : JsonWithData('a', { 'x' : 1, 'y' : 2 }) }
+        writer.save(state)
+        state['count'] = 1
+        state['items'].append(4)
+        del state['data'].sensorData['y']
+        writer.save(state)
+        state['items'] = [1]
+        state['new'] = JsonNoData()
+        writer.save(state)
+        lines = self.read_lines()
+        self.assertEqual(3, len(lines))
+        self.assertIn('checkpoint', lines[0])
+        self.assertEqual([['del', ['data', VALUE_TAG, 'sensorData', 'y']],
+                          ['set', ['count'], 1],
+                          ['set', ['items', 3], 4]],
+                         sorted(lines[1]['delta']))
+        self.assertEqual(state, read_snapshot(self.filename))
+
+    def test_unchanged_state_not_written(self):
+        writer = SnapshotWriter(self.filename)
+        writer.save([1, 2])
+        writer.save([1, 2])
+        self.assertEqual(1, len(self.read_lines()))
+
+    def test_checkpoint_interval(self):
+        writer = SnapshotWriter(self.filename, checkpoint_interval=2)
+        for i in range(4):
+            writer.save({ 'i' : i })
+        self.assertEqual([{ 'checkpoint' : { 'i' : 3 } }], self.read_lines())
+        writer.save({ 'i' : 4 })
+        self.assertEqual(2, len(self.read_lines()))
+        self.assertEqual({ 'i' : 4 }, read_snapshot(self.filename))
+
+    def test_type_change(self):
+        writer = SnapshotWriter(self.filename)
+        writer.save({ 'a' : 1, 'b' : [1] })
+        writer.save({ 'a' : 1.0, 'b' : { 'c' : True } })
+        self.assertEqual({ 'a' : 1.0, 'b' : { 'c' : True } }, read_snapshot(self.filename))
+        self.assertIs(float, type(read_snapshot(self.filename)['a']))
+
+    def test_tree_matches_json(self):
+        state = { 'a' : (1, 2.5, u'caf\xe9'), 1 : [JsonSubClass('b', { 'c' : None }, 'n')], 'd' : JsonNoData() }
+        self.assertEqual(json.loads(to_json_string(state)), to_json_tree(state))
+
+    def test_tree_copies_containers(self):
+        data = JsonWithData('a', [1, 2])
+        tree = to_json_tree(data)
+        data.sensorData.append(3)
+        self.assertEqual([1, 2], tree[VALUE_TAG]['sensorData'])
+
+    def test_failed_append_forces_checkpoint(self):
+        writer = SnapshotWriter(self.filename)
+        writer.save({ 'a' : 1 })
+        def failing_open(name, mode):
+            fp = open(name, mode)
+            fp.write('{"delta": [["set"')
+            fp.close()
+            raise IOError("No space left on device")
+        jsonobj.open = failing_open
+        try:
+            self.assertRaises(IOError, writer.save, { 'a' : 2 })
+        finally:
+            del jsonobj.open
+        writer.save({ 'a' : 3 })
+        self.assertEqual([{ 'checkpoint' : { 'a' : 3 } }], self.read_lines())
+        self.assertEqual({ 'a' : 3 }, read_snapshot(self.filename))
+
+    def test_torn_last_line_ignored(self):
+        writer = SnapshotWriter(self.filename)
+        writer.save({ 'a' : 1 })
+        writer.save({ 'a' : 2 })
+        with open(self.filename, 'ab') as fp:
+            fp.write('{"delta": [["set", ["a"], 3')
+        self.assertEqual({ 'a' : 2 }, read_snapshot(self.filename))
+
+# counts calls to from_json to show when objects are created
+class JsonCounted(JsonWithData):
+    created = 0
+
+    def __init__(self, source, sensorData):
+        super(JsonCounted, self).__init__(source, sensorData)
+
+    @classmethod
+    def from_json(klass, json_object):
+        klass.created += 1
+        return klass(json_object['source'], json_object['sensorData'])
+
+class TestLazy(unittest.TestCase):
+    def setUp(self):
+        JsonCounted.created = 0
+        self.ev = JsonCounted('top', [JsonCounted('first', 1), JsonCounted('second', JsonCounted('deep', 2))])
+        self.sv = to_json_string(self.ev)
+
+    def test_nested_objects_created_on_use(self):
+        rev = from_json_string(self.sv, lazy=True)
+        # the top level object is always created
+        self.assertIs(JsonCounted, type(rev))
+        self.assertEqual(1, JsonCounted.created)
+        self.assertEqual('first', rev.sensorData[0].source)
+        self.assertEqual(2, JsonCounted.created)
+        self.assertEqual('second', rev.sensorData[1].source)
+        self.assertEqual(3, JsonCounted.created)
+        self.assertEqual(self.ev, rev)
+        self.assertEqual(4, JsonCounted.created)
+
+    def test_proxy_looks_like_object(self):
+        rev = from_json_string(self.sv, lazy=True)
+        first = rev.sensorData[0]
+        self.assertIs(LazyObject, type(first))
+        self.assertTrue(isinstance(first, JsonCounted))
+        self.assertIs(JsonCounted, first.__class__)
+        self.assertEqual(JsonCounted('first', 1), first)
+        self.assertEqual('JsonCounted', first.name())
+        first.source = 'changed'
+        self.assertEqual('changed', resolve(first).source)
+        self.assertIs(resolve(first), resolve(resolve(first)))
+
+    def test_eager_by_default(self):
+        rev = from_json_string(self.sv)
+        self.assertEqual(4, JsonCounted.created)
+        self.assertIs(JsonCounted, type(rev.sensorData[0]))
+
+    def test_not_top_level_object(self):
+        rev = from_json_string(to_json_string([JsonCounted('a', 1)]), lazy=True)
+        self.assertEqual(0, JsonCounted.created)
+        self.assertEqual([JsonCounted('a', 1)], rev)
+
+    def test_shared_refs(self):
+        shared = JsonCounted('shared', 1)
+        rev = from_json_string(to_json_string([shared, shared], share_refs=True), lazy=True, share_refs=True)
+        self.assertIs(rev[0], rev[1])
+        self.assertEqual('shared', rev[1].source)
+        self.assertEqual(1, JsonCounted.created)
+
+class TestJsonStream(unittest.TestCase):
+    RECORDS = [ JsonWithData('foo', [1, 2.5, u'caf\xe9']),
+                12345,
+                JsonNoData(),
+                { 'nested' : JsonSubClass('bar', None, 'baz') },
+                "a string with ] and , in it",
+                [ ],
+                True ]
+
+    def test_round_trip(self):
+        fp = StringIO()
+        to_json_stream(iter(self.RECORDS), fp)
+        self.assertEqual(json.loads(to_json_string(self.RECORDS)), json.loads(fp.getvalue()))
+        # a tiny chunk size makes values span several reads
+        for chunk_size in (1, 3, 7, 1024):
+            fp.seek(0)
+            self.assertEqual(self.RECORDS, list(from_json_stream(fp, chunk_size)))
+
+    def test_number_at_chunk_boundary(self):
+        self.assertEqual([123456, 7], list(from_json_stream(StringIO('[123456,7]'), 4)))
+        self.assertEqual([123456], list(from_json_stream(StringIO(' [ 123456 ] '), 4)))
+
+    def test_empty_array(self):
+        self.assertEqual([], list(from_json_stream(StringIO(' [ ] '))))
+
+    def test_is_lazy(self):
+        elements = from_json_stream(StringIO('[1, 2, oops'))
+        self.assertEqual(1, next(elements))
+        self.assertEqual(2, next(elements))
+        self.assertRaises(ValueError, next, elements)
+
+    def test_not_an_array(self):
+        self.assertRaises(ValueError, list, from_json_stream(StringIO('{"a": 1}')))
+        self.assertRaises(ValueError, list, from_json_stream(StringIO('[1 2]')))
+        self.assertRaises(ValueError, list, from_json_stream(StringIO('[1, ')))
+
+    def test_json_lines(self):
+        fp = StringIO()
+        to_json_lines(self.RECORDS, fp)
+        self.assertEqual(len(self.RECORDS), fp.getvalue().count('\n'))
+        fp.seek(0)
+        self.assertEqual(self.RECORDS, list(from_json_lines(fp)))
+
+    def test_json_lines_skips_blank_lines(self):
+        self.assertEqual([1, JsonNoData()],
+                         list(from_json_lines(StringIO('1\n\n' + to_json_string(JsonNoData()) + '\n'))))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -4,10 +4,14 @@ Created on 1 Apr 2013
 @author: dsnowdon
 '''
 
+import json
+import os
+import shutil
+import tempfile
 import types
 import unittest
 
-from naoutil.naoenv import NaoEnvironment, make_environment
+from naoutil.naoenv import NaoEnvironment, make_environment, LANGUAGE_CHANGED_EVENT, CACHE_STATS_KEY
 from naoutil_tests.mock import *
 
 def set_mock_add_proxy(obj, func):
@@ -101,5 +105,61 @@ class NonLocalizedProperties(unittest.TestCase):
     def test_integer_property_value(self):
         self.assertEqual(8080, self.env.get_property("config2", "portNumber"))
         
+    def test_property_from_subdirectory(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(tmpdir, 'conf'))
+            with open(os.path.join(tmpdir, 'conf', 'app.properties'), 'w') as fp:
+                fp.write('port=9559\n')
+            self.env.resources_dir = lambda: tmpdir
+            self.assertEqual("9559", self.env.get_property("conf/app", "port"))
+        finally:
+            shutil.rmtree(tmpdir)
+
+class LocalizedText(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.env = make_mock_environment()
+
+    def test_localized_text(self):
+        self.assertEqual("Hello", self.env.localized_text("defaults", "hello"))
+
+    def test_localized_texts(self):
+        self.assertEqual({ "hello" : "Hello", "doesnotexist" : None },
+                         self.env.localized_texts("defaults", ["hello", "doesnotexist"]))
+
+class LanguageCaching(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.env = make_mock_environment()
+        self.tts = self.env.tts
+
+    def test_language_is_remembered(self):
+        self.assertEqual("en", self.env.current_language_code())
+        self.assertEqual("en", self.env.current_language_code())
+        self.assertEqual(1, self.tts.get_language_calls)
+
+    def test_language_expires(self):
+        self.env.set_language_ttl(0)
+        self.env.current_language()
+        self.tts.language = "French"
+        self.assertEqual("fr", self.env.current_language_code())
+        self.assertEqual(2, self.tts.get_language_calls)
+
+    def test_language_change_event(self):
+        self.env.set_language_ttl(None)
+        self.assertEqual("English", self.env.current_language())
+        self.tts.language = "French"
+        self.assertEqual("English", self.env.current_language())
+        self.env._on_language_changed(LANGUAGE_CHANGED_EVENT, "French", None)
+        self.assertEqual("French", self.env.current_language())
+
+class CacheStats(unittest.TestCase):
+    def test_publish_cache_stats(self):
+        env = make_mock_environment()
+        env.localized_text("defaults", "hello")
+        stats = env.publish_cache_stats()
+        self.assertEqual(stats, json.loads(env.memory.getData(CACHE_STATS_KEY)))
+
 if __name__ == '__main__':
     unittest.main()
@@ -6,8 +6,11 @@ Created on Apr 21, 2012
 '''
 import inspect
 import os
+import StringIO
+import sys
 import unittest
 import tempfile
+import time
 import shutil
 
 import naoutil.i18n as i18n
@@ -44,6 +47,11 @@ class Test(unittest.TestCase):
         hello_value = i18n.get_property(self.resources_path, "defaults", "zh", "hello")
         self.assertEquals("你好", hello_value)
 
+    def testLazyPropertiesFile(self):
+        path = os.path.join(self.resources_path, "defaults_fr.properties")
+        props = i18n.read_properties_file(path, lazy=True)
+        self.assertEqual(i18n.read_properties_file(path), dict(props))
+
     def testLoadOptionsTextFileEnglish(self):
         options = i18n.read_text_options(self.resources_path, "example", "en")
         self.assertEqual(5, len(options))
@@ -144,6 +152,479 @@ class TestPropertyFileCache(unittest.TestCase):
     def testRemovingCache(self):
         pass
 
+class TestFindResource(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        i18n.clear_cache()
+        i18n.configure_cache(check_interval=0)
+
+    def tearDown(self):
+        i18n.configure_cache(check_interval=i18n.DEFAULT_CHECK_INTERVAL)
+        i18n.clear_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def make_file(self, name):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as fp:
+            fp.write('hello=Hello\n')
+        return path
+
+    def set_dir_mtime(self, mtime):
+        os.utime(self.tmpdir, (mtime, mtime))
+
+    def settle(self):
+        # a directory modified more than a second ago can't be missing files
+        # added since it was scanned
+        self.set_dir_mtime(time.time() - 10)
+
+    def testFallsBackToDefaultLanguage(self):
+        self.make_file('defaults_en.properties')
+        path = i18n.find_resource(self.tmpdir, 'defaults', 'fr', [i18n.EXT_PROPERTIES])
+        self.assertTrue(path.endswith('defaults_en.properties'))
+
+    def testBasenameInSubdirectory(self):
+        os.mkdir(os.path.join(self.tmpdir, 'conf'))
+        self.make_file(os.path.join('conf', 'app_en.properties'))
+        path = i18n.find_resource(self.tmpdir, 'conf/app', 'fr', [i18n.EXT_PROPERTIES])
+        self.assertEqual(os.path.join(self.tmpdir, 'conf', 'app_en.properties'), path)
+        self.assertEqual("Hello", i18n.get_property(self.tmpdir, 'conf/app', 'en', 'hello'))
+
+    def testNotFoundIsRemembered(self):
+        # within the check interval only a lookup which hasn't failed before
+        # should look at the directory again
+        i18n.configure_cache(check_interval=3600)
+        self.settle()
+        self.assertIsNone(i18n.find_resource(self.tmpdir, 'defaults', 'fr', [i18n.EXT_PROPERTIES]))
+        probes = []
+        real_stat = os.stat
+        real_listdir = os.listdir
+        def counting_stat(path):
+            probes.append(path)
+            return real_stat(path)
+        def counting_listdir(path):
+            probes.append(path)
+            return real_listdir(path)
+        os.stat = counting_stat
+        os.listdir = counting_listdir
+        try:
+            self.assertIsNone(i18n.find_resource(self.tmpdir, 'defaults', 'fr', [i18n.EXT_PROPERTIES]))
+            self.assertEqual([], probes)
+            self.assertIsNone(i18n.find_resource(self.tmpdir, 'other', 'fr', [i18n.EXT_PROPERTIES]))
+            self.assertNotEqual([], probes)
+        finally:
+            os.stat = real_stat
+            os.listdir = real_listdir
+
+    def testNegativeHitsAreCounted(self):
+        self.settle()
+        i18n.reset_cache_stats()
+        for _ in range(3):
+            i18n.find_resource(self.tmpdir, 'defaults', 'fr', [i18n.EXT_PROPERTIES])
+        self.assertEqual(2, i18n.cache_stats()['negative_hits'])
+
+    def testNewFileIsFoundAfterDirectoryChanges(self):
+        self.make_file('defaults_en.properties')
+        path = i18n.find_resource(self.tmpdir, 'defaults', 'fr', [i18n.EXT_PROPERTIES])
+        self.assertTrue(path.endswith('defaults_en.properties'))
+        self.make_file('defaults_fr.properties')
+        path = i18n.find_resource(self.tmpdir, 'defaults', 'fr', [i18n.EXT_PROPERTIES])
+        self.assertTrue(path.endswith('defaults_fr.properties'))
+
+    def testFileAddedWithinMtimeGranularity(self):
+        # the directory was modified in the same second as it is scanned
+        mtime = int(time.time())
+        self.set_dir_mtime(mtime)
+        i18n.configure_cache(check_interval=3600)
+        i18n.reset_cache_stats()
+        self.assertIsNone(i18n.find_resource(self.tmpdir, 'defaults', 'fr', [i18n.EXT_PROPERTIES]))
+        self.assertIsNone(i18n.find_resource(self.tmpdir, 'defaults', 'fr', [i18n.EXT_PROPERTIES]))
+        self.assertEqual(0, i18n.cache_stats()['negative_hits'])
+        # a file added within the same second leaves the directory's mtime unchanged
+        self.make_file('defaults_fr.properties')
+        self.set_dir_mtime(mtime)
+        path = i18n.find_resource(self.tmpdir, 'defaults', 'fr', [i18n.EXT_PROPERTIES])
+        self.assertEqual(os.path.join(self.tmpdir, 'defaults_fr.properties'), path)
+
+class TestResourceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.high = tempfile.mkdtemp()
+        self.low = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.high)
+        shutil.rmtree(self.low)
+
+    def make_file(self, dir_name, name):
+        path = os.path.join(dir_name, name)
+        with open(path, 'w') as fp:
+            fp.write('hello=Hello\n')
+        return path
+
+    def testParseFilename(self):
+        self.assertEqual([('defaults_en', None, '.properties'), ('defaults', 'en', '.properties')],
+                         i18n.parse_filename('defaults_en.properties'))
+        self.assertEqual([('config2', None, '.json')], i18n.parse_filename('config2.json'))
+
+    def testOverlaidDirectories(self):
+        self.make_file(self.low, 'defaults_en.properties')
+        self.make_file(self.low, 'defaults_fr.properties')
+        high_fr = self.make_file(self.high, 'defaults_fr.properties')
+        index = i18n.ResourceIndex([self.high, self.low])
+        self.assertEqual(high_fr, index.find('defaults', 'fr', [i18n.EXT_PROPERTIES]))
+        self.assertEqual(os.path.join(self.low, 'defaults_en.properties'),
+                         index.find('defaults', 'de', [i18n.EXT_PROPERTIES]))
+
+    def testFileWithoutLanguage(self):
+        config = self.make_file(self.low, 'config.json')
+        index = i18n.ResourceIndex(self.low)
+        self.assertEqual(config, index.find('config', None, [i18n.EXT_PROPERTIES, i18n.EXT_JSON]))
+        self.assertIsNone(index.find('config', 'en', [i18n.EXT_PROPERTIES, i18n.EXT_JSON]))
+
+    def testRefresh(self):
+        index = i18n.ResourceIndex(self.low)
+        self.assertEqual({}, index.files)
+        path = self.make_file(self.low, 'example_en.txt')
+        index.refresh()
+        self.assertEqual(path, index.get('example', 'en', i18n.EXT_TEXT))
+
+class TestCompiledCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.resources_path = os.path.dirname(inspect.getfile(inspect.currentframe())) + "/../../../../resources"
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ['defaults_en.properties', 'json_example_en.json', 'example_en.txt']:
+            copyFile(os.path.join(self.resources_path, name), os.path.join(self.tmpdir, name))
+        i18n.clear_cache()
+
+    def tearDown(self):
+        i18n.clear_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def testCompileResources(self):
+        catalogs = i18n.compile_resources(self.tmpdir)
+        self.assertEqual(2, len(catalogs))
+        for name in ['defaults_en.properties', 'json_example_en.json']:
+            source = os.path.join(self.tmpdir, name)
+            self.assertEqual(i18n.read_properties_file(source),
+                             i18n.read_catalog(i18n.catalog_filename(source)))
+
+    def testCatalogIsPreferred(self):
+        source = os.path.join(self.tmpdir, 'defaults_en.properties')
+        i18n.write_catalog(i18n.catalog_filename(source), { u'hello' : u'Hello from catalog' },
+                           i18n.file_signature(source))
+        self.assertEqual("Hello from catalog", i18n.get_property(self.tmpdir, "defaults", "en", "hello"))
+
+    def testOutOfDateCatalogIsIgnored(self):
+        source = os.path.join(self.tmpdir, 'defaults_en.properties')
+        catalog = i18n.catalog_filename(source)
+        signature = i18n.file_signature(source)
+        i18n.write_catalog(catalog, { u'hello' : u'Hello from catalog' }, signature)
+        # edit the source within the same second, so its modification time
+        # may not change
+        with open(source, 'a') as fp:
+            fp.write('\nextra=Extra\n')
+        os.utime(source, (signature[0], signature[0]))
+        self.assertEqual("Hello", i18n.get_property(self.tmpdir, "defaults", "en", "hello"))
+        self.assertEqual("Extra", i18n.get_property(self.tmpdir, "defaults", "en", "extra"))
+
+    def testCatalogForOlderSourceIsIgnored(self):
+        source = os.path.join(self.tmpdir, 'defaults_en.properties')
+        (mtime, size) = i18n.file_signature(source)
+        i18n.write_catalog(i18n.catalog_filename(source), { u'hello' : u'Hello from catalog' },
+                           (mtime - 10, size))
+        self.assertEqual("Hello", i18n.get_property(self.tmpdir, "defaults", "en", "hello"))
+
+class TestTextLines(unittest.TestCase):
+
+    def setUp(self):
+        self.resources_path = os.path.dirname(inspect.getfile(inspect.currentframe())) + "/../../../../resources"
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_file(self, contents):
+        path = os.path.join(self.tmpdir, 'lines_en.txt')
+        with open(path, 'wb') as fp:
+            fp.write(contents)
+        return path
+
+    def testSameLinesAsReadTextOptions(self):
+        for lc in ['en', 'fr', 'zh']:
+            path = os.path.join(self.resources_path, 'example_' + lc + '.txt')
+            lines = i18n.TextLines(path)
+            options = i18n.read_text_options(self.resources_path, "example", lc)
+            self.assertEqual(options, [lines[i] for i in range(len(lines))])
+
+    def testSurroundingWhitespaceIgnored(self):
+        lines = i18n.TextLines(self.make_file('\n  one\ntwo\n\n'))
+        self.assertEqual(2, len(lines))
+        self.assertEqual('one', lines[0])
+        self.assertEqual('two', lines[-1])
+
+    def testEmptyFile(self):
+        lines = i18n.TextLines(self.make_file(''))
+        self.assertEqual(0, len(lines))
+        self.assertIsNone(lines.choice())
+
+    def testChooseTextLine(self):
+        options = i18n.read_text_options(self.resources_path, "example", "fr")
+        for _ in range(10):
+            self.assertIn(i18n.choose_text_line(self.resources_path, "example", "fr"), options)
+
+    def testFileTruncatedWhileCached(self):
+        lines = ['phrase number %d' % i for i in range(1000)]
+        path = self.make_file('\n'.join(lines))
+        self.assertIn(i18n.choose_text_line(self.tmpdir, "lines", "en"), lines)
+        # rewrite the file in place within the cache's check interval
+        with open(path, 'w') as fp:
+            fp.write('x\n')
+        for _ in range(10):
+            self.assertIn(i18n.choose_text_line(self.tmpdir, "lines", "en"), lines)
+
+class TestTextOptions(unittest.TestCase):
+
+    def setUp(self):
+        self.resources_path = os.path.dirname(inspect.getfile(inspect.currentframe())) + "/../../../../resources"
+
+    def testOptionsAreCached(self):
+        path = i18n.find_resource(self.resources_path, "defaults", "en", [i18n.EXT_PROPERTIES])
+        options = i18n.read_options_with_cache(path, "attractAttention", "/")
+        self.assertTrue(isinstance(options, tuple))
+        self.assertIs(options, i18n.read_options_with_cache(path, "attractAttention", "/"))
+
+    def testChooseOptionFromProperties(self):
+        options = i18n.read_text_options(self.resources_path, "defaults", "fr", "attractAttention", "/")
+        for _ in range(10):
+            self.assertIn(i18n.choose_text_option(self.resources_path, "defaults", "fr", "attractAttention", "/"),
+                          options)
+
+    def testChooseOptionFromJson(self):
+        options = i18n.read_text_options(self.resources_path, "json_example", "en", "attractAttention")
+        self.assertIn(i18n.choose_text_option(self.resources_path, "json_example", "en", "attractAttention"),
+                      options)
+
+    def testChooseOptionFromTextFile(self):
+        options = i18n.read_text_options(self.resources_path, "example", "zh")
+        self.assertIn(i18n.choose_text_option(self.resources_path, "example", "zh"), options)
+
+    def testOptionsDontEvictBundles(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(tmpdir, 'config_en.properties'), 'w') as fp:
+                for i in range(80):
+                    fp.write('option%d=a%d/b%d\n' % (i, i, i))
+            with open(os.path.join(tmpdir, 'other_en.properties'), 'w') as fp:
+                fp.write('hello=Hello\n')
+            i18n.clear_cache()
+            loads = []
+            real_load = i18n.load_properties_file
+            def counting_load(filename, *args):
+                loads.append(os.path.basename(filename))
+                return real_load(filename, *args)
+            i18n.load_properties_file = counting_load
+            self.assertEqual("Hello", i18n.get_property(tmpdir, "other", "en", "hello"))
+            for i in range(80):
+                self.assertIn(i18n.choose_text_option(tmpdir, "config", "en", "option%d" % i),
+                              ['a%d' % i, 'b%d' % i])
+            self.assertEqual("Hello", i18n.get_property(tmpdir, "other", "en", "hello"))
+            self.assertIn("a0", i18n.read_text_options(tmpdir, "config", "en", "option0"))
+            self.assertEqual(['other_en.properties', 'config_en.properties'], loads)
+            self.assertIn(os.path.join(tmpdir, 'config_en.properties'), i18n.property_file_cache)
+        finally:
+            i18n.load_properties_file = real_load
+            i18n.clear_cache()
+            shutil.rmtree(tmpdir)
+
+class TestGetProperties(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        with open(os.path.join(self.tmpdir, 'app_en.properties'), 'w') as fp:
+            fp.write('hello=Hello\ngoodbye=Goodbye\n')
+        with open(os.path.join(self.tmpdir, 'app_fr.properties'), 'w') as fp:
+            fp.write('hello=Bonjour\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testGetProperties(self):
+        self.assertEqual({ 'hello' : 'Bonjour' },
+                         i18n.get_properties(self.tmpdir, "app", "fr", ["hello"]))
+
+    def testMissingPropertyFallsBackToDefaultLanguage(self):
+        self.assertEqual({ 'hello' : 'Bonjour', 'goodbye' : 'Goodbye', 'missing' : None },
+                         i18n.get_properties(self.tmpdir, "app", "fr", ["hello", "goodbye", "missing"]))
+
+    def testMissingFileUsesDefault(self):
+        self.assertEqual({ 'hello' : '?' },
+                         i18n.get_properties(self.tmpdir, "nosuchfile", "fr", ["hello"], "?"))
+
+class TestPreload(unittest.TestCase):
+
+    def setUp(self):
+        self.resources_path = os.path.dirname(inspect.getfile(inspect.currentframe())) + "/../../../../resources"
+        i18n.clear_cache()
+
+    def tearDown(self):
+        i18n.clear_cache()
+
+    def testFindPreloadPaths(self):
+        paths = i18n.find_preload_paths(self.resources_path, ["fr"], ["defaults", "example"])
+        self.assertEqual(['defaults_fr.properties', 'example_fr.txt'], [os.path.basename(p) for p in paths])
+
+    def testPreload(self):
+        preloader = i18n.preload(self.resources_path, languages=["French", "en"], workers=2)
+        self.assertTrue(preloader.wait(10))
+        self.assertTrue(preloader.done())
+        self.assertEqual({}, preloader.errors)
+        self.assertEqual((preloader.loaded, preloader.loaded), preloader.progress())
+        for path in preloader.paths:
+            self.assertIn(path, i18n.property_file_cache)
+
+    def testPreloadNothing(self):
+        preloader = i18n.preload(self.resources_path, basenames=["doesnotexist"])
+        self.assertTrue(preloader.wait(0))
+        self.assertEqual((0, 0), preloader.progress())
+
+class TestResourceWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        i18n.clear_cache()
+        # lookups would notice changes immediately if it weren't for the watcher
+        i18n.configure_cache(check_interval=0)
+        self.watcher = None
+
+    def tearDown(self):
+        if not self.watcher is None:
+            self.watcher.stop()
+        i18n.configure_cache(check_interval=i18n.DEFAULT_CHECK_INTERVAL)
+        i18n.clear_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def start_watcher(self):
+        # polled by hand rather than by the thread
+        self.watcher = i18n.watch(self.tmpdir, interval=3600)
+        return self.watcher
+
+    def write_file(self, name, contents):
+        with open(os.path.join(self.tmpdir, name), 'w') as fp:
+            fp.write(contents)
+
+    def testChangedFileIsReloaded(self):
+        self.write_file('app_en.properties', 'hello=Hello\nbye=a/b\n')
+        self.write_file('other_en.properties', 'hello=Hi\n')
+        self.assertEqual("Hello", i18n.get_property(self.tmpdir, "app", "en", "hello"))
+        self.assertEqual(['a', 'b'], i18n.read_text_options(self.tmpdir, "app", "en", "bye"))
+        self.assertEqual("Hi", i18n.get_property(self.tmpdir, "other", "en", "hello"))
+        watcher = self.start_watcher()
+        self.write_file('app_en.properties', 'hello=Hello again\nbye=c/d/e\n')
+        self.assertEqual("Hello", i18n.get_property(self.tmpdir, "app", "en", "hello"))
+        self.assertEqual([os.path.join(self.tmpdir, 'app_en.properties')], watcher.poll())
+        self.assertEqual("Hello again", i18n.get_property(self.tmpdir, "app", "en", "hello"))
+        self.assertEqual(['c', 'd', 'e'], i18n.read_text_options(self.tmpdir, "app", "en", "bye"))
+        self.assertEqual([], watcher.poll())
+
+    def testBrokenFileKeepsOldVersion(self):
+        self.write_file('app_en.json', '{ "hello" : "Hello" }')
+        self.assertEqual("Hello", i18n.get_property(self.tmpdir, "app", "en", "hello"))
+        watcher = self.start_watcher()
+        self.write_file('app_en.json', '{ "hello" : "Hel')
+        self.assertEqual("Hello", i18n.get_property(self.tmpdir, "app", "en", "hello"))
+        self.assertEqual([], watcher.poll())
+        self.assertEqual("Hello", i18n.get_property(self.tmpdir, "app", "en", "hello"))
+
+    def testPartlyWrittenFileNotReadByLookup(self):
+        self.write_file('app_en.properties', 'hello=Hello\nbye=Bye\n')
+        self.assertEqual("Bye", i18n.get_property(self.tmpdir, "app", "en", "bye"))
+        watcher = self.start_watcher()
+        # any prefix of a properties file parses, so only the watcher
+        # should decide when to load it
+        self.write_file('app_en.properties', 'hello=Hello again\n')
+        self.assertEqual("Bye", i18n.get_property(self.tmpdir, "app", "en", "bye"))
+        self.write_file('app_en.properties', 'hello=Hello again\nbye=Bye again\n')
+        watcher.poll()
+        self.assertEqual("Bye again", i18n.get_property(self.tmpdir, "app", "en", "bye"))
+
+    def testStoppedWatcherLeavesChangesToLookups(self):
+        self.write_file('app_en.properties', 'hello=Hello\n')
+        self.assertEqual("Hello", i18n.get_property(self.tmpdir, "app", "en", "hello"))
+        self.start_watcher().stop()
+        self.watcher = None
+        self.write_file('app_en.properties', 'hello=Hello again, with a different size\n')
+        self.assertEqual("Hello again, with a different size", i18n.get_property(self.tmpdir, "app", "en", "hello"))
+
+    def testTextLineIndexIsReloaded(self):
+        self.write_file('ex_en.txt', 'old line\n')
+        self.assertEqual("old line", i18n.choose_text_line(self.tmpdir, "ex", "en"))
+        watcher = self.start_watcher()
+        self.write_file('ex_en.txt', 'new line\n')
+        self.assertEqual("old line", i18n.choose_text_line(self.tmpdir, "ex", "en"))
+        self.assertEqual([os.path.join(self.tmpdir, 'ex_en.txt')], watcher.poll())
+        self.assertEqual("new line", i18n.choose_text_line(self.tmpdir, "ex", "en"))
+
+    def testOptionsReloadedAfterBundleEvicted(self):
+        self.write_file('opts_en.properties', 'bye=a/b\n')
+        self.assertEqual(['a', 'b'], i18n.read_text_options(self.tmpdir, "opts", "en", "bye"))
+        # leave only the options derived from the bundle in the cache
+        path = os.path.join(self.tmpdir, 'opts_en.properties')
+        i18n.property_file_cache.invalidate(path)
+        watcher = self.start_watcher()
+        self.write_file('opts_en.properties', 'bye=c/d/e\n')
+        self.assertEqual([path], watcher.poll())
+        self.assertEqual(['c', 'd', 'e'], i18n.read_text_options(self.tmpdir, "opts", "en", "bye"))
+
+    def testWatcherThread(self):
+        self.write_file('app_en.properties', 'hello=Hello\n')
+        self.assertEqual("Hello", i18n.get_property(self.tmpdir, "app", "en", "hello"))
+        self.watcher = i18n.watch(self.tmpdir, interval=0.01)
+        self.write_file('app_en.properties', 'hello=Hello again\n')
+        for _ in range(200):
+            if i18n.get_property(self.tmpdir, "app", "en", "hello") != "Hello":
+                break
+            time.sleep(0.01)
+        self.assertEqual("Hello again", i18n.get_property(self.tmpdir, "app", "en", "hello"))
+
+class TestLoadMany(unittest.TestCase):
+
+    def setUp(self):
+        self.resources_path = os.path.dirname(inspect.getfile(inspect.currentframe())) + "/../../../../resources"
+        self.tmpdir = tempfile.mkdtemp()
+        copyFile(os.path.join(self.resources_path, 'defaults_en.properties'), self.tmpdir)
+        copyFile(os.path.join(self.resources_path, 'json_example_en.json'), self.tmpdir)
+        with open(os.path.join(self.tmpdir, 'broken_en.json'), 'w') as fp:
+            fp.write('{ "hello" : ')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testLoadMany(self):
+        paths = i18n.find_properties_files([self.tmpdir])
+        self.assertEqual(3, len(paths))
+        results = i18n.load_many(paths, workers=2)
+        self.assertEqual(paths, [r.path for r in results])
+        for r in results:
+            if r.path.endswith('broken_en.json'):
+                self.assertIsNone(r.properties)
+                self.assertTrue(r.error.startswith('ValueError'))
+            else:
+                self.assertIsNone(r.error)
+                self.assertEqual(i18n.read_properties_file(r.path), r.properties)
+
+    def testMain(self):
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            self.assertEqual(1, i18n.main(['-w', '1', self.tmpdir]))
+            os.remove(os.path.join(self.tmpdir, 'broken_en.json'))
+            self.assertEqual(0, i18n.main(['--workers', '1', '--compile', self.tmpdir]))
+        finally:
+            sys.stdout = stdout
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'defaults_en.properties.catalog')))
+
 def copyFile(src, dest):
     try:
         shutil.copy(src, dest)
@@ -9,7 +9,9 @@ if command -v nosetests >/dev/null 2>&1; then
     nosetests -w naoutil/src/test/python/naoutil_tests
 else
     echo "Running tests using python unittest"
+    python -m unittest naoutil_tests.test_filecache
     python -m unittest naoutil_tests.test_general
+    python -m unittest naoutil_tests.test_jprops
     python -m unittest naoutil_tests.test_jsonobj
     python -m unittest naoutil_tests.test_naoenv
 fi